@@ -1,6 +1,5 @@
 from __future__ import annotations
 import argparse
-import json
 import re
 from pathlib import Path
 import sys
@@ -10,9 +9,10 @@ from dotenv import load_dotenv
 sys.path.append("..")  
 load_dotenv("../.env")
 
+from modules.json_utils import dumps_json_bytes
 from modules.login_gmail import create_login
 from modules.gmail_query import (
-    find_label_id, list_messages, get_thread, simplify_message,
+    find_label_id, list_messages, get_threads_batch, simplify_message,
     build_gmail_query, unique_thread_ids
 )
 
@@ -21,8 +21,7 @@ DEFAULT_TOKEN = "../token_files/token_gmail_v1.json"
 DEFAULT_OUTDIR = "raw_messages"
 
 def _sanitize(s: str) -> str:
-    s = s.strip().replace(" ", "_")
-    s = re.sub(r"[^a-zA-Z0-9_\-\.@]+", "_", s)
+    s = re.sub(r"[^A-Za-z0-9_.@-]", "_", s.strip())
     s = re.sub(r"_+", "_", s)
     return s[:120].strip("_")
 
@@ -69,8 +68,12 @@ def dump_threads(
     print(f"🧵 Threads únicas encontradas: {len(thread_ids)}")
 
     saved = 0
-    for tid in thread_ids:
-        t = get_thread(service, tid)
+    missing = []
+    for tid, t, err in get_threads_batch(service, thread_ids):
+        if err is not None:
+            print(f"⚠️  Falha ao baixar a thread {tid} (tentativas esgotadas): {err}")
+            missing.append(tid)
+            continue
         messages = t.get("messages", [])
         emails = [simplify_message(m) for m in messages]
         emails.sort(key=lambda e: e.get("timestamp", ""))
@@ -89,12 +92,14 @@ def dump_threads(
         fname = f"{prefix}__{sender_key}__{subject_key}.json"
 
         path = Path(outdir) / fname
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(path, "wb") as f:
+            f.write(dumps_json_bytes(data, indent=True))
 
         saved += 1
 
     print(f"✅ {saved} arquivo(s) salvo(s) em '{outdir}'")
+    if missing:
+        raise SystemExit(f"❌ {len(missing)} thread(s) não baixada(s): {', '.join(missing)}")
 
 def parse_args():
     p = argparse.ArgumentParser(description="Baixa threads do Gmail para JSON (um arquivo por thread).")
@@ -18,10 +18,13 @@ Uso:
   python3 llm_extract_data.py
   python3 llm_extract_data.py --raw_dir raw_messages --out_complete complete_data --out_incomplete incomplete_data \
       --model openai/gpt-4o --max_files 500
+  python3 llm_extract_data.py --batch_api   # Batch API da OpenAI (requer OPENAI_API_KEY)
+  python3 llm_extract_data.py --resume      # continua execução interrompida (pula arquivos já no JSONL)
 
 Requisitos:
   - pip install python-dotenv openai==1.*
   - Definir OPENROUTER_API_KEY no ambiente ou .env
+  - (Opcional) OPENROUTER_RPM / OPENROUTER_TPM: limites do tier (requisições/tokens por minuto)
 """
 
 from __future__ import annotations
@@ -32,10 +35,15 @@ import re
 import sys
 import time
 import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Optional, Union
+from typing import Any, Dict, Iterator, List, Tuple, Optional, Union
 
-from dotenv import load_dotenv
+sys.path.append("..")
+
+from modules.rate_limit import bucket_from_env, estimate_tokens
 
 # === Config de pastas padrão ===
 DEFAULT_RAW_DIR = "raw_messages"
@@ -138,6 +146,14 @@ Conteúdo do e-mail/thread (texto/JSON bruto):
 ----------------
 """
 
+# HEADER_FIELDS é constante: o template é resolvido uma única vez no import e,
+# por chamada, só o conteúdo do e-mail é concatenado entre prefixo e sufixo.
+_FIELDS_JSON = json.dumps(HEADER_FIELDS, ensure_ascii=False, indent=2)
+_USER_PROMPT_PREFIX, _USER_PROMPT_SUFFIX = USER_PROMPT_TEMPLATE.format(
+    fields_json=_FIELDS_JSON,
+    email_text="{email_text}",
+).split("{email_text}")
+
 # === Utilidades ===
 
 def ensure_dir(p: Path) -> None:
@@ -152,13 +168,9 @@ def _load_if_json(txt: str) -> Optional[dict]:
 
 
 def read_text_any(path: Path) -> str:
-    """Lê como texto, mas se for JSON retorna uma versão pretty (melhor para o LLM)."""
+    """Lê como texto. JSON é repassado como está: re-serializar com indentação não muda nada para o LLM."""
     try:
-        txt = path.read_text(encoding="utf-8", errors="ignore")
-        obj = _load_if_json(txt)
-        if obj is not None:
-            return json.dumps(obj, ensure_ascii=False, indent=2)
-        return txt
+        return path.read_text(encoding="utf-8", errors="ignore")
     except Exception as e:
         return f"<<ERRO AO LER ARQUIVO: {e}>>"
 
@@ -174,12 +186,45 @@ def extract_body_from_rawtext(raw_text: str) -> str:
     return raw_text
 
 
+def load_raw_and_body(path: Path) -> Tuple[str, str]:
+    """Leitura + parsing do arquivo bruto: (texto para o LLM, corpo para heurísticas)."""
+    raw_text = read_text_any(path)
+    return raw_text, extract_body_from_rawtext(raw_text)
+
+
+def iter_prefetched(files: List[Path], prefetch: int) -> Iterator[Tuple[Path, Optional[Tuple[str, str]]]]:
+    """
+    Produz (path, (raw_text, body_text)) na ordem de `files`, lendo em um thread pool
+    com até `prefetch` arquivos adiantados — a leitura do disco sobrepõe a chamada ao LLM.
+    Com prefetch <= 0, não lê nada (process_file lê inline).
+    """
+    if prefetch <= 0:
+        for p in files:
+            yield p, None
+        return
+
+    with ThreadPoolExecutor(max_workers=min(prefetch, 8)) as read_pool:
+        pending: deque = deque()
+        for p in files:
+            pending.append((p, read_pool.submit(load_raw_and_body, p)))
+            if len(pending) > prefetch:
+                path, fut = pending.popleft()
+                yield path, fut.result()
+        while pending:
+            path, fut = pending.popleft()
+            yield path, fut.result()
+
+
 EMAIL_REGEX = re.compile(r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}", re.UNICODE)
 
+# Itera linhas sob demanda (sem materializar a lista de splitlines())
+_LINE_RE = re.compile(r"[^\r\n]+")
+
 
 def extract_top_from_email(body_text: str) -> str:
     head = body_text[:3000]
-    for line in head.splitlines():
+    for m_line in _LINE_RE.finditer(head):
+        line = m_line.group(0)
         if line.strip().lower().startswith("from:"):
             m = EMAIL_REGEX.search(line)
             if m:
@@ -193,25 +238,22 @@ def extract_supplier_email_heuristic(body_text: str) -> str:
         "parrottrips.com", "facebook.com", "instagram.com", "linkedin.com",
         "gmail.com", "googlemail.com",
     }
-    candidates_priority: List[str] = []
-    candidates_regular: List[str] = []
-    for line in body_text.splitlines():
-        emails = EMAIL_REGEX.findall(line)
-        if not emails:
+    # Um candidato de linha "From:/To:" vence qualquer outro: retorna no primeiro achado
+    first_regular = ""
+    for m_line in _LINE_RE.finditer(body_text):
+        line = m_line.group(0)
+        if "@" not in line:
             continue
-        for em in emails:
+        is_header = line.strip().lower().startswith(("from:", "to:"))
+        for em in EMAIL_REGEX.findall(line):
             domain = em.split("@")[-1].lower()
             if domain in ignore_domains:
                 continue
-            if line.strip().lower().startswith(("from:", "to:")):
-                candidates_priority.append(em)
-            else:
-                candidates_regular.append(em)
-    if candidates_priority:
-        return candidates_priority[0]
-    if candidates_regular:
-        return candidates_regular[0]
-    return ""
+            if is_header:
+                return em
+            if not first_regular:
+                first_regular = em
+    return first_regular
 
 
 def coerce_price(value: Any) -> Any:
@@ -222,6 +264,12 @@ def coerce_price(value: Any) -> Any:
     s = str(value).strip()
     if not s:
         return ""
+    # Caminho rápido: sem vírgula, a normalização abaixo não altera nada
+    if "," not in s:
+        try:
+            return float(s)
+        except ValueError:
+            return ""
     # BR: "1.234,56" | US: "1,234.56" | simples: "1234,56" or "1234.56"
     if s.count(",") == 1 and s.count(".") > 1:
         s = s.replace(".", "").replace(",", ".")
@@ -261,21 +309,48 @@ def complete_check(record: Dict[str, Any], required_fields: List[str]) -> Tuple[
 
 
 def load_env() -> None:
+    from dotenv import load_dotenv
     load_dotenv()
 
 
 # === OpenRouter (SDK OpenAI) ===
 
 def make_client():
+    """
+    Cliente OpenRouter com um pool de conexões keep-alive reutilizado entre arquivos.
+    HTTP/2 (multiplexação numa única conexão TLS) é ativado quando o pacote `h2` está instalado.
+    Feche com `client.close()` ao final da execução.
+    """
+    import importlib.util
+    import httpx
     from openai import OpenAI
     base_url = "https://openrouter.ai/api/v1"
     api_key = os.getenv("OPENROUTER_API_KEY", "").strip()
     if not api_key:
         raise RuntimeError("Defina OPENROUTER_API_KEY no ambiente ou .env")
-    client = OpenAI(base_url=base_url, api_key=api_key)
+    http_client = httpx.Client(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+    client = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client)
     return client
 
 
+@lru_cache(maxsize=None)
+def get_rate_limiters():
+    """(limitador de RPM, limitador de TPM) lidos do ambiente na primeira chamada (após load_env)."""
+    return bucket_from_env("OPENROUTER_RPM"), bucket_from_env("OPENROUTER_TPM")
+
+
+def build_messages(email_text: str) -> List[Dict[str, str]]:
+    user_prompt = _USER_PROMPT_PREFIX + email_text[:100000] + _USER_PROMPT_SUFFIX
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
 def call_llm(client, model: str, http_referer: str | None, x_title: str | None, email_text: str) -> str:
     extra_headers = {}
     if http_referer:
@@ -283,22 +358,23 @@ def call_llm(client, model: str, http_referer: str | None, x_title: str | None,
     if x_title:
         extra_headers["X-Title"] = x_title
 
-    user_prompt = USER_PROMPT_TEMPLATE.format(
-        fields_json=json.dumps(HEADER_FIELDS, ensure_ascii=False, indent=2),
-        email_text=email_text[:100000],
-    )
+    messages = build_messages(email_text)
+
+    rpm_limiter, tpm_limiter = get_rate_limiters()
+    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
 
     max_retries = 6
     base_delay = 2.0
     for attempt in range(1, max_retries + 1):
+        if rpm_limiter:
+            rpm_limiter.acquire()
+        if tpm_limiter:
+            tpm_limiter.acquire(prompt_tokens)
         try:
             completion = client.chat.completions.create(
                 extra_headers=extra_headers if extra_headers else None,
                 model=model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt},
-                ],
+                messages=messages,
                 temperature=0.0,
             )
             return completion.choices[0].message.content or ""
@@ -311,12 +387,23 @@ def call_llm(client, model: str, http_referer: str | None, x_title: str | None,
             raise
 
 
+def _strip_fences(s: str) -> str:
+    """Remove cercas markdown (```json ... ```) das pontas — literais, sem regex."""
+    s = s.strip()
+    if s[:7].lower() == "```json":
+        s = s[7:].lstrip()
+    elif s.startswith("```"):
+        s = s[3:].lstrip()
+    if s.endswith("```"):
+        s = s[:-3].rstrip()
+    return s
+
+
 def parse_llm_to_list(text: str) -> List[Dict[str, Any]]:
     """Converte a resposta do LLM para **lista de objetos**.
     Aceita: array JSON direto; objeto único; objeto com chave \"Cotações\".
     """
-    cleaned = sanitize_json_only(text).strip()
-    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", cleaned, flags=re.IGNORECASE | re.DOTALL)
+    cleaned = _strip_fences(sanitize_json_only(text))
 
     try:
         obj: Union[List[Any], Dict[str, Any]] = json.loads(cleaned)
@@ -344,8 +431,11 @@ OLD_TO_NEW_KEYS = {
     "Descrição do Quarto": "Descrição dos Quartos",
 }
 
+_OLD_KEY_SET = frozenset(OLD_TO_NEW_KEYS)
+
 def normalize_key_aliases(d: Dict[str, Any]) -> Dict[str, Any]:
-    if not d:
+    # Caso comum (só chaves novas): nenhuma cópia do dict
+    if not d or _OLD_KEY_SET.isdisjoint(d):
         return d
     out = dict(d)
     for old_k, new_k in OLD_TO_NEW_KEYS.items():
@@ -568,6 +658,34 @@ def synthesize_room_description(quote: Dict[str, Any]) -> str:
 
 # === Pipeline por arquivo ===
 
+def _list_raw_files(raw_dir: Path) -> List[Path]:
+    """Arquivos (recursivo, sem ocultos) em ordem; os.walk usa o tipo da entrada, sem glob nem stat por arquivo."""
+    files: List[Path] = []
+    for dirpath, _dirnames, filenames in os.walk(raw_dir):
+        base = Path(dirpath)
+        files.extend(base / name for name in filenames if not name.startswith("."))
+    files.sort()
+    return files
+
+def _done_sources(jsonl_path: Path) -> set:
+    """
+    Arquivos já processados segundo o agregado (`_source_raw` de cada linha), para --resume.
+    Falhas de processamento não contam (são tentadas de novo); linha truncada é ignorada.
+    """
+    done: set = set()
+    if not jsonl_path.exists():
+        return done
+    with jsonl_path.open("r", encoding="utf-8") as fp:
+        for line in fp:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(row, dict) and not str(row.get("_error", "")).startswith("PROCESS_FAIL"):
+                done.add(row.get("_source_raw"))
+    done.discard(None)
+    return done
+
 def enrich_and_validate_quote(quote: Dict[str, Any], body_text: str) -> Dict[str, Any]:
     # Normaliza possíveis chaves antigas para as novas
     quote = normalize_key_aliases(quote)
@@ -618,13 +736,26 @@ def process_file(
     path: Path,
     out_complete: Path,
     out_incomplete: Path,
+    prepared: Optional[Tuple[str, str]] = None,
 ) -> List[Dict[str, Any]]:
-    raw_text_pretty = read_text_any(path)
-    body_text = extract_body_from_rawtext(raw_text_prety := raw_text_pretty)  # mantém raw para debug
+    # `prepared` vem do prefetch em background (ver iter_prefetched); senão lê aqui
+    raw_text, body_text = prepared if prepared is not None else load_raw_and_body(path)
 
     # === Chamada ao LLM ===
-    llm_text = call_llm(client, model, http_referer, x_title, raw_text_pretty)
+    llm_text = call_llm(client, model, http_referer, x_title, raw_text)
 
+    return save_quotes_from_llm_text(model, path, body_text, llm_text, out_complete, out_incomplete)
+
+
+def save_quotes_from_llm_text(
+    model: str,
+    path: Path,
+    body_text: str,
+    llm_text: str,
+    out_complete: Path,
+    out_incomplete: Path,
+) -> List[Dict[str, Any]]:
+    """Parsing da resposta do LLM → enriquecimento/validação → gravação 1:1 por cotação."""
     meta_base: Dict[str, Any] = {
         "_source_raw": str(path),
         "_llm_model": model,
@@ -673,6 +804,103 @@ def process_file(
     return results
 
 
+# === Batch API (OpenAI) — execuções em massa sem requisito de latência ===
+
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def make_batch_client():
+    from openai import OpenAI
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("Defina OPENAI_API_KEY no ambiente ou .env para usar --batch_api")
+    return OpenAI(api_key=api_key)
+
+
+def run_batch_api(
+    files: List[Path],
+    model: str,
+    out_complete: Path,
+    out_incomplete: Path,
+    work_dir: Path,
+    prefetch: int = 8,
+) -> Iterator[Tuple[Path, Union[List[Dict[str, Any]], Exception]]]:
+    """
+    Envia todos os prompts como um único job da Batch API (custo ~50% menor), aguarda
+    a conclusão com backoff exponencial e produz (path, cotações) — ou (path, exceção)
+    para requisições que falharam — pelo mesmo pipeline de process_file.
+    """
+    client = make_batch_client()
+    # Modelos OpenRouter vêm como "openai/gpt-4o"; a API da OpenAI espera só "gpt-4o"
+    batch_model = model.split("/", 1)[1] if model.startswith("openai/") else model
+
+    ensure_dir(work_dir)
+    input_path = work_dir / "batch_input.jsonl"
+    paths: Dict[str, Path] = {}
+    with input_path.open("w", encoding="utf-8") as fp:
+        for i, (path, prepared) in enumerate(iter_prefetched(files, prefetch), 1):
+            raw_text, _ = prepared if prepared is not None else load_raw_and_body(path)
+            custom_id = f"{i:06d}"
+            paths[custom_id] = path
+            line = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": batch_model, "messages": build_messages(raw_text), "temperature": 0.0},
+            }
+            fp.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    try:
+        with input_path.open("rb") as fp:
+            input_file = client.files.create(file=fp, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        print(f"📤 Batch {batch.id} criado com {len(paths)} requisição(ões); aguardando conclusão...")
+
+        delay = 10.0
+        while batch.status not in BATCH_TERMINAL_STATUSES:
+            time.sleep(delay)
+            delay = min(delay * 2, 300.0)
+            batch = client.batches.retrieve(batch.id)
+            print(f"⏳ Batch {batch.id}: {batch.status}")
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch.id} terminou com status '{batch.status}'")
+
+        output_text = client.files.content(batch.output_file_id).text
+        (work_dir / "batch_output.jsonl").write_text(output_text, encoding="utf-8")
+    finally:
+        client.close()
+
+    seen: set[str] = set()
+    for raw_line in output_text.splitlines():
+        if not raw_line.strip():
+            continue
+        rec = json.loads(raw_line)
+        custom_id = rec.get("custom_id")
+        path = paths.get(custom_id)
+        if path is None:
+            continue
+        seen.add(custom_id)
+
+        resp = rec.get("response") or {}
+        if rec.get("error") or resp.get("status_code") != 200:
+            yield path, RuntimeError(f"BATCH_REQUEST_FAIL: {rec.get('error') or resp.get('status_code')}")
+            continue
+
+        choices = (resp.get("body") or {}).get("choices") or []
+        llm_text = ((choices[0].get("message") or {}).get("content") or "") if choices else ""
+        _, body_text = load_raw_and_body(path)
+        yield path, save_quotes_from_llm_text(model, path, body_text, llm_text, out_complete, out_incomplete)
+
+    for custom_id, path in paths.items():
+        if custom_id not in seen:
+            yield path, RuntimeError("BATCH_NO_RESULT")
+
+
 def main():
     load_env()
 
@@ -685,6 +913,10 @@ def main():
     parser.add_argument("--http_referer", default=os.getenv("OPENROUTER_HTTP_REFERER", "").strip(), help="HTTP-Referer (ranking OpenRouter).")
     parser.add_argument("--x_title", default=os.getenv("OPENROUTER_X_TITLE", "").strip(), help="X-Title (ranking OpenRouter).")
     parser.add_argument("--max_files", type=int, default=0, help="Limite opcional de arquivos para processar (0 = todos).")
+    parser.add_argument("--batch_api", action="store_true", help="Usa a Batch API da OpenAI (requer OPENAI_API_KEY): mais barato, sem tempo real.")
+    parser.add_argument("--batch_dir", default="batch_api", help="Diretório para batch_input.jsonl/batch_output.jsonl (modo --batch_api).")
+    parser.add_argument("--prefetch", type=int, default=8, help="Arquivos lidos/parseados adiantados em background enquanto o LLM responde (0 = leitura inline).")
+    parser.add_argument("--resume", action="store_true", help="Continua uma execução interrompida: pula arquivos já presentes no JSONL agregado e acrescenta a ele.")
     args = parser.parse_args()
 
     raw_dir = Path(args.raw_dir)
@@ -699,9 +931,13 @@ def main():
     ensure_dir(out_complete)
     ensure_dir(out_incomplete)
 
-    client = make_client()
-
-    files = sorted([p for p in raw_dir.glob("**/*") if p.is_file() and not p.name.startswith(".")])
+    files = _list_raw_files(raw_dir)
+    if args.resume:
+        done = _done_sources(jsonl_out)
+        if done:
+            before = len(files)
+            files = [f for f in files if str(f) not in done]
+            print(f"⏭️  --resume: {before - len(files)} arquivo(s) já processado(s) em {jsonl_out}")
     if args.max_files > 0:
         files = files[: args.max_files]
 
@@ -711,48 +947,92 @@ def main():
 
     print(f"🧠 Extração via LLM em {len(files)} arquivo(s) de {raw_dir}/ — múltiplas cotações por arquivo habilitadas (campos novos)")
 
-    aggregated: List[Dict[str, Any]] = []
     ok_quotes, bad_quotes = 0, 0
 
-    for i, f in enumerate(files, 1):
-        print(f"[{i}/{len(files)}] → {f.name}")
-        try:
-            out_list = process_file(
-                client=client,
+    # Agregado gravado em streaming (uma linha por cotação, à medida que são produzidas),
+    # sem acumular as cotações em memória até o fim da execução.
+    # Com --resume o arquivo é continuado e cada arquivo de entrada vai ao disco (fsync) de uma vez:
+    # uma interrupção perde no máximo o arquivo em andamento.
+    try:
+        if args.resume and jsonl_out.exists() and jsonl_out.stat().st_size:
+            with jsonl_out.open("rb") as tail_fp:
+                tail_fp.seek(-1, os.SEEK_END)
+                needs_newline = tail_fp.read(1) != b"\n"
+            jsonl_fp = jsonl_out.open("a", encoding="utf-8")
+            if needs_newline:
+                # última linha truncada por uma interrupção: isola antes de acrescentar
+                jsonl_fp.write("\n")
+        else:
+            jsonl_fp = jsonl_out.open("w", encoding="utf-8")
+    except Exception as e:
+        print(f"⚠️  Falha ao abrir JSONL agregado ({jsonl_out}): {e}")
+        jsonl_fp = None
+
+    def _emit(rows: List[Dict[str, Any]]) -> None:
+        nonlocal ok_quotes, bad_quotes
+        if jsonl_fp is not None:
+            jsonl_fp.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+            if args.resume:
+                jsonl_fp.flush()
+                os.fsync(jsonl_fp.fileno())
+        for row in rows:
+            if ("_missing_fields" in row) or ("_error" in row):
+                bad_quotes += 1
+            else:
+                ok_quotes += 1
+
+    def _emit_failure(f: Path, e: Exception) -> None:
+        err_obj = {
+            "_source_raw": str(f),
+            "_llm_model": args.model,
+            "_error": f"PROCESS_FAIL: {e}",
+        }
+        (out_incomplete / (f.stem + "__process_error.json")).write_text(
+            json.dumps(err_obj, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        _emit([err_obj])
+
+    try:
+        if args.batch_api:
+            results = run_batch_api(
+                files,
                 model=args.model,
-                http_referer=args.http_referer or None,
-                x_title=args.x_title or None,
-                path=f,
                 out_complete=out_complete,
                 out_incomplete=out_incomplete,
+                work_dir=Path(args.batch_dir),
+                prefetch=args.prefetch,
             )
-            for row in out_list:
-                aggregated.append(row)
-                if ("_missing_fields" in row) or ("_error" in row):
-                    bad_quotes += 1
+            for f, result in results:
+                if isinstance(result, Exception):
+                    _emit_failure(f, result)
                 else:
-                    ok_quotes += 1
-        except Exception as e:
-            err_obj = {
-                "_source_raw": str(f),
-                "_llm_model": args.model,
-                "_error": f"PROCESS_FAIL: {e}",
-            }
-            (out_incomplete / (f.stem + "__process_error.json")).write_text(
-                json.dumps(err_obj, ensure_ascii=False, indent=2),
-                encoding="utf-8",
-            )
-            aggregated.append(err_obj)
-            bad_quotes += 1
-
-    # Salva agregado (uma linha por cotação)
-    try:
-        with jsonl_out.open("w", encoding="utf-8") as fp:
-            for row in aggregated:
-                fp.write(json.dumps(row, ensure_ascii=False) + "\n")
-        print(f"\n📦 Agregado salvo em: {jsonl_out}")
-    except Exception as e:
-        print(f"⚠️  Falha ao salvar JSONL agregado ({jsonl_out}): {e}")
+                    _emit(result)
+        else:
+            client = make_client()
+            try:
+                for i, (f, prepared) in enumerate(iter_prefetched(files, args.prefetch), 1):
+                    print(f"[{i}/{len(files)}] → {f.name}")
+                    try:
+                        out_list = process_file(
+                            client=client,
+                            model=args.model,
+                            http_referer=args.http_referer or None,
+                            x_title=args.x_title or None,
+                            path=f,
+                            out_complete=out_complete,
+                            out_incomplete=out_incomplete,
+                            prepared=prepared,
+                        )
+                        _emit(out_list)
+                    except Exception as e:
+                        _emit_failure(f, e)
+            finally:
+                client.close()
+    finally:
+        if jsonl_fp is not None:
+            jsonl_fp.close()
+            print(f"\n📦 Agregado salvo em: {jsonl_out}")
 
     print(f"\n✅ Cotações completas: {ok_quotes} | ⚠️ Cotações incompletas/erros: {bad_quotes} | Total de cotações: {ok_quotes + bad_quotes}")
 
@@ -2,24 +2,33 @@ from __future__ import annotations
 
 import os
 import sys
-import glob
 import json
 import re
 import time
 import unicodedata
 from collections import defaultdict, Counter
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple, Optional
 
 from dotenv import load_dotenv
 import requests
 
+try:
+    import re2  # opcional: google-re2 (autômato linear, sem backtracking)
+except ImportError:
+    re2 = None
+
 sys.path.append("..")
 load_dotenv("../.env")
 
-from modules.json_utils import ensure_dir
+from modules.json_utils import ensure_dir, parse_json_bytes, dumps_json_bytes
+from modules.rate_limit import bucket_from_env
+from modules.llm_cache import cache_enabled, cache_key, cache_get, cache_put
 
 INCOMPLETE_DIR = "incomplete_data"
 DRAFTS_DIR = "draft_emails"
+CACHE_DIR = os.path.join(".cache", "followups")
 
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "gpt-4o-mini").strip()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "").strip()
@@ -29,40 +38,62 @@ DEFAULT_FROM_NAME = os.getenv("PARROT_FROM_NAME", "Equipe Parrot Trips").strip()
 DEFAULT_FROM_EMAIL = os.getenv("PARROT_FROM_EMAIL", "").strip()
 DEFAULT_CC = os.getenv("PARROT_DEFAULT_CC", "").strip()
 
+# Requisições simultâneas ao LLM e limite proativo por minuto (vazio/0 = sem limite)
+FOLLOWUP_CONCURRENCY = int(os.getenv("FOLLOWUP_CONCURRENCY", "8") or 8)
+# A partir de quantos arquivos vale pagar o custo de subir processos para o parsing
+PROCESS_POOL_MIN_FILES = 64
+# FOLLOWUP_SKIP_LLM_IF_ALL_TEMPLATED=1: grupos cujas pendências têm todas pergunta pronta
+# usam o e-mail padrão (sem LLM)
+SKIP_LLM_IF_ALL_TEMPLATED = os.getenv("FOLLOWUP_SKIP_LLM_IF_ALL_TEMPLATED", "").strip() == "1"
+_RPM_LIMITER = bucket_from_env("OPENROUTER_RPM")
+
 # -------------------- util: normalização/regex --------------------
 
-_EMAIL_RE = re.compile(
-    r'(?:"?([^"]*)"?\s*)<([A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,})>|'
-    r'([A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,})'
-)
+# Só o endereço: "Nome <email>" e e-mail solto casam igual; o nome é lido à parte (_parse_name).
+# Domínio como rótulos separados por ponto: sem classes sobrepostas ([.\-]+ seguido de \.),
+# o que limita o backtracking em cabeçalhos longos/malformados.
+# Com google-re2 instalado, a varredura de corpos longos roda em tempo linear.
+_EMAIL_RE = (re2 or re).compile(r"[A-Za-z0-9._%+\-]+@(?:[A-Za-z0-9\-]+\.)+[A-Za-z]{2,}")
+_NAME_RE = re.compile(r'"?([^"<]+?)"?\s*<')  # ancorado no início via .match
+_SLUG_INVALID_RE = re.compile(r"[^a-z0-9]+")
+_SLUG_DASHES_RE = re.compile(r"-{2,}")
+_MISSING_KEY = b'"_missing_fields'
+_MISSING_PER_ITEM_KEY = b'"_missing_fields_per_item"'
+_EMPTY_MISSING_RE = re.compile(rb'"_missing_fields"\s*:\s*\[\s*\]')
 
 def _extract_emails(s: str) -> List[str]:
-    out: List[str] = []
-    for m in _EMAIL_RE.finditer(s or ""):
-        email = m.group(2) or m.group(3)
-        if email and "://" not in email:
-            out.append(email)
-    seen = set()
-    uniq = []
-    for e in out:
-        if e not in seen:
-            seen.add(e)
-            uniq.append(e)
-    return uniq
+    s = s or ""
+    # Sem "@" não há e-mail possível: evita o regex no caso comum
+    if "@" not in s:
+        return []
+    # findall (sem grupos) devolve os matches direto do C; dict preserva a ordem no dedup
+    return list(dict.fromkeys(_EMAIL_RE.findall(s)))
 
 def _parse_name(s: str) -> str:
-    m = re.search(r'^"?([^"<]+?)"?\s*<', s or "")
+    m = _NAME_RE.match(s or "")
     return m.group(1).strip() if m else ""
 
+class _CombiningMarks(dict):
+    """Tabela para str.translate: remove marcas combinantes (Mn); preenchida sob demanda."""
+    def __missing__(self, cp: int):
+        v = None if unicodedata.category(chr(cp)) == "Mn" else cp
+        self[cp] = v
+        return v
+
+_COMBINING = _CombiningMarks()
+
+@lru_cache(maxsize=4096)
 def _norm(s: str) -> str:
     s = (s or "").strip().lower()
-    s = unicodedata.normalize("NFD", s)
-    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    if s.isascii():
+        return s
+    return unicodedata.normalize("NFD", s).translate(_COMBINING)
 
+@lru_cache(maxsize=4096)
 def _slug(s: str) -> str:
     s = _norm(s)
-    s = re.sub(r"[^a-z0-9]+", "-", s)
-    s = re.sub(r"-{2,}", "-", s).strip("-")
+    s = _SLUG_INVALID_RE.sub("-", s)
+    s = _SLUG_DASHES_RE.sub("-", s).strip("-")
     return s or "sem-nome"
 
 # -------------------- mapeamento de perguntas --------------------
@@ -90,15 +121,32 @@ QUESTION_TEMPLATES = {
     "Tipo de quarto (normalizado)": "Poderiam confirmar os tipos/categorias de quarto disponíveis (por exemplo: duplo, twin, triplo) em formato padronizado?",
 }
 
-def question_for_field(field_name: str) -> str:
+# Índice normalizado (minúsculas, sem acentos) montado uma vez: lookup exato vira um hash
+_Q_EXACT = {_norm(k): v for k, v in QUESTION_TEMPLATES.items()}
+
+# Campos com variações de texto: casados por prefixo (normalizado)
+_Q_PREFIX = (
+    (_norm("serviços incluso"), QUESTION_TEMPLATES["Serviços incluso?"]),
+    (_norm("forma de pagamento"), QUESTION_TEMPLATES["Forma de pagamento"]),
+)
+
+@lru_cache(maxsize=512)
+def _template_question(field_name: str) -> Optional[str]:
+    """Pergunta pronta para o campo (exata, normalizada ou por prefixo); None se não houver."""
     s = field_name.strip()
     if s in QUESTION_TEMPLATES:
         return QUESTION_TEMPLATES[s]
-    if s.lower().startswith("serviços incluso"):
-        return QUESTION_TEMPLATES["Serviços incluso?"]
-    if s.lower().startswith("forma de pagamento"):
-        return QUESTION_TEMPLATES["Forma de pagamento"]
-    return f"Poderiam informar o campo “{field_name}”?"
+    ns = _norm(s)
+    question = _Q_EXACT.get(ns)
+    if question:
+        return question
+    for prefix, question in _Q_PREFIX:
+        if ns.startswith(prefix):
+            return question
+    return None
+
+def question_for_field(field_name: str) -> str:
+    return _template_question(field_name) or f"Poderiam informar o campo “{field_name}”?"
 
 # -------------------- prompt do LLM --------------------
 
@@ -108,13 +156,8 @@ SYSTEM_INSTRUCTIONS = (
     "Não invente dados; apenas peça o que estiver faltando."
 )
 
-def build_followup_prompt(context: Dict) -> str:
-    supplier_name = context.get("supplier_name") or ""
-    orig_subj = context.get("original_subject") or ""
-    missing_questions = context.get("missing_questions") or []
-    from_name = context.get("from_name") or DEFAULT_FROM_NAME
-    bullets = "\n".join(f"- {q}" for q in missing_questions)
-    return f"""
+# Texto fixo do prompt montado (e aparado) uma vez; por grupo só entram os campos variáveis
+_FOLLOWUP_TMPL = """
 Escreva um e-mail profissional, curto e simpático em Português (Brasil).
 Objetivo: pedir informações que ficaram pendentes em uma cotação de hospedagem.
 
@@ -130,47 +173,119 @@ Diretrizes:
 
 Dados:
 - Nome do contato/fornecedor (se houver): "{supplier_name}"
-- Assunto original (se houver): "{orig_subj}"
+- Assunto original (se houver): "{orig_subject}"
 
 Perguntas (use exatamente estas, em bullets):
 {bullets}
 """.strip()
 
-# -------------------- OpenRouter --------------------
+def build_followup_prompt(context: Dict) -> str:
+    return _FOLLOWUP_TMPL.format(
+        supplier_name=context.get("supplier_name") or "",
+        orig_subject=context.get("original_subject") or "",
+        from_name=context.get("from_name") or DEFAULT_FROM_NAME,
+        bullets="\n".join(f"- {q}" for q in context.get("missing_questions") or []),
+    )
 
-def _openrouter_request(messages: List[Dict[str, str]],
-                        model: str,
-                        max_retries: int = 5,
-                        timeout: int = 60) -> Dict:
-    if not OPENROUTER_API_KEY:
-        raise SystemExit("⛔ OPENROUTER_API_KEY não definido no .env")
+# -------------------- OpenRouter --------------------
 
-    url = f"{OPENROUTER_BASE}/chat/completions"
-    headers = {
+def _make_session() -> requests.Session:
+    """Sessão HTTP keep-alive compartilhada: o handshake TCP/TLS acontece uma vez por conexão do pool."""
+    session = requests.Session()
+    session.headers.update({
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "https://parrottrips.com",
         "X-Title": "ParrotTrips-Followups",
-    }
+    })
+    # pool do tamanho da concorrência, para as threads não disputarem conexões
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(1, FOLLOWUP_CONCURRENCY))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_SESSION = _make_session()
+
+_JSON_DECODER = json.JSONDecoder()
+
+def _json_start(text: str) -> int:
+    """Onde o JSON da resposta começa: 1º "{" depois da cerca ``` (se houver), senão o 1º "{". -1 se não houver."""
+    fence = text.find("```")
+    start = text.find("{", fence) if fence != -1 else -1
+    return start if start != -1 else text.find("{")
+
+def _decode_reply_json(text: str):
+    """Objeto JSON da resposta a partir de _json_start (raw_decode ignora o que vier depois); None se não houver."""
+    start = _json_start(text)
+    if start == -1:
+        return None
+    try:
+        data, _ = _JSON_DECODER.raw_decode(text, start)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _read_sse_text(resp: requests.Response) -> str:
+    """
+    Consome o stream SSE do OpenRouter acumulando delta.content. Para de ler assim que o
+    JSON da resposta (mesma regra de _request_followup) decodifica; senão lê até [DONE].
+    """
+    parts: List[str] = []
+    for line in resp.iter_lines():
+        # linhas vazias separam eventos; ": ..." são comentários de keep-alive.
+        # Decodifica por linha: SSE costuma vir sem charset e requests não saberia o encoding.
+        if not line or not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip().decode("utf-8", "replace")
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if chunk.get("error"):
+            raise RuntimeError(f"OpenRouter stream error: {str(chunk['error'])[:500]}")
+        choices = chunk.get("choices") or []
+        delta = (choices[0].get("delta") or {}) if choices else {}
+        piece = delta.get("content") or ""
+        if not piece:
+            continue
+        parts.append(piece)
+        if "}" in piece and _decode_reply_json("".join(parts)) is not None:
+            break
+    return "".join(parts)
+
+def _openrouter_stream(messages: List[Dict[str, str]],
+                       model: str,
+                       max_retries: int = 5,
+                       timeout: int = 60) -> str:
+    """Chat completion com stream=true; devolve o texto acumulado da resposta."""
+    if not OPENROUTER_API_KEY:
+        raise SystemExit("⛔ OPENROUTER_API_KEY não definido no .env")
+
+    url = f"{OPENROUTER_BASE}/chat/completions"
     payload = {
         "model": model,
         "messages": messages,
         "temperature": 0.2,
         "response_format": { "type": "text" },
+        "stream": True,
     }
 
     backoff = 1.5
     for attempt in range(1, max_retries + 1):
+        if _RPM_LIMITER:
+            _RPM_LIMITER.acquire()
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=timeout)
-            if resp.status_code == 200:
-                return resp.json()
-            if resp.status_code in (429, 500, 502, 503, 504):
-                retry_after = resp.headers.get("Retry-After")
-                delay = float(retry_after) if retry_after else backoff ** attempt
-                time.sleep(min(delay, 15))
-                continue
-            raise RuntimeError(f"OpenRouter HTTP {resp.status_code}: {resp.text[:500]}")
+            with _SESSION.post(url, json=payload, timeout=timeout, stream=True) as resp:
+                if resp.status_code == 200:
+                    return _read_sse_text(resp)
+                if resp.status_code in (429, 500, 502, 503, 504):
+                    retry_after = resp.headers.get("Retry-After")
+                    delay = float(retry_after) if retry_after else backoff ** attempt
+                    time.sleep(min(delay, 15))
+                    continue
+                raise RuntimeError(f"OpenRouter HTTP {resp.status_code}: {resp.text[:500]}")
         except requests.RequestException:
             if attempt == max_retries:
                 raise
@@ -178,35 +293,55 @@ def _openrouter_request(messages: List[Dict[str, str]],
     raise RuntimeError("Falha ao contatar OpenRouter após várias tentativas.")
 
 def _call_llm_followup(prompt: str) -> Dict[str, str]:
+    # Cache em disco: mesmo modelo + instruções + prompt → mesma resposta (pula a chamada)
+    use_cache = cache_enabled()
+    key = cache_key(OPENROUTER_MODEL, SYSTEM_INSTRUCTIONS, prompt)
+    if use_cache:
+        cached = cache_get(CACHE_DIR, key)
+        if isinstance(cached, dict):
+            return cached
+
+    reply = _request_followup(prompt)
+    # Só respostas com corpo entram no cache (falhas/vazios são tentados de novo na próxima execução)
+    if use_cache and reply.get("body"):
+        cache_put(CACHE_DIR, key, reply)
+    return reply
+
+def _request_followup(prompt: str) -> Dict[str, str]:
     messages = [
         {"role": "system", "content": SYSTEM_INSTRUCTIONS},
         {"role": "user", "content": prompt},
     ]
-    data = _openrouter_request(messages, model=OPENROUTER_MODEL)
-    text = ""
-    try:
-        choices = data.get("choices") or []
-        if choices:
-            msg = choices[0].get("message") or {}
-            text = (msg.get("content") or "").strip()
-    except Exception:
-        text = ""
+    text = _openrouter_stream(messages, model=OPENROUTER_MODEL).strip()
 
     if not text:
         return {"subject": "Informações pendentes da cotação", "body": ""}
 
-    m = re.search(r"```json\s*([\s\S]*?)```", text, flags=re.I)
-    raw = m.group(1).strip() if m else text
-    o0, o1 = raw.find("{"), raw.rfind("}")
-    if o0 != -1 and o1 != -1 and o1 > o0:
-        raw = raw[o0:o1+1]
-    try:
-        data = json.loads(raw)
-        subj = str(data.get("subject", "")).strip() or "Informações pendentes da cotação"
-        body = str(data.get("body", "")).strip()
-        return {"subject": subj, "body": body}
-    except Exception:
+    data = _decode_reply_json(text)
+    if data is None:
         return {"subject": "Informações pendentes da cotação", "body": text}
+    subj = str(data.get("subject", "")).strip() or "Informações pendentes da cotação"
+    body = str(data.get("body", "")).strip()
+    return {"subject": subj, "body": body}
+
+def _iter_llm_followups(prompts: List[str], max_workers: int = FOLLOWUP_CONCURRENCY) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Dispara as completions em paralelo (até max_workers) e devolve (índice do prompt, resposta)
+    conforme cada uma termina — quem consome pode gravar o resultado sem esperar o lote todo.
+    O OpenRouter não tem endpoint de lote.
+    """
+    if not prompts:
+        return
+    # Grupos distintos podem gerar o mesmo prompt (mesmo contato/assunto/perguntas): 1 chamada por prompt único
+    indices: Dict[str, List[int]] = defaultdict(list)
+    for i, p in enumerate(prompts):
+        indices[p].append(i)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(indices)))) as pool:
+        futures = {pool.submit(_call_llm_followup, p): p for p in indices}
+        for fut in as_completed(futures):
+            reply = fut.result()
+            for i in indices[futures[fut]]:
+                yield i, dict(reply)
 
 # -------------------- helpers: payload -> infos --------------------
 
@@ -240,14 +375,25 @@ def _friendly_supplier_name(payload: Dict) -> str:
         name = (payload.get("Nome do hotel") or "").strip()
     return name
 
+_DIRECT_EMAIL_KEYS = ("Email do fornecedor", "supplier_email", "email_fornecedor")
+_COMMON_EMAIL_KEYS = ("Fornecedor", "from", "sender", "recipient", "to", "cc", "body")
+
+def _first_email_in_fields(payload: Dict, keys: Tuple[str, ...]) -> Optional[str]:
+    """
+    1º e-mail do 1º campo (na ordem de `keys`) que tiver algum. Os campos são unidos por
+    quebra de linha (que nunca faz parte de um e-mail) e varridos com uma única busca.
+    """
+    joined = "\n".join(str(payload.get(k) or "") for k in keys)
+    if "@" not in joined:
+        return None
+    m = _EMAIL_RE.search(joined)
+    return m.group(0) if m else None
+
 def _supplier_email(payload: Dict) -> Optional[str]:
     # Prioridade 1: campo direto
-    for k in ("Email do fornecedor", "supplier_email", "email_fornecedor"):
-        v = (payload.get(k) or "").strip()
-        if v:
-            emails = _extract_emails(v)
-            if emails:
-                return emails[0]
+    email = _first_email_in_fields(payload, _DIRECT_EMAIL_KEYS)
+    if email:
+        return email
 
     # Prioridade 2: thread meta
     thr = payload.get("thread")
@@ -258,13 +404,7 @@ def _supplier_email(payload: Dict) -> Optional[str]:
                 return senders[-1]
 
     # Prioridade 3: varredura em campos comuns
-    for k in ("Fornecedor", "from", "sender", "recipient", "to", "cc", "body"):
-        v = (payload.get(k) or "").strip()
-        if v:
-            emails = _extract_emails(v)
-            if emails:
-                return emails[0]
-    return None
+    return _first_email_in_fields(payload, _COMMON_EMAIL_KEYS)
 
 def _original_subject(payload: Dict) -> str:
     for k in ("Assunto", "subject", "_subject"):
@@ -274,13 +414,14 @@ def _original_subject(payload: Dict) -> str:
     pm = payload.get("_picked_email_meta") or {}
     return (pm.get("subject") or "").strip()
 
-def _group_key(payload: Dict) -> Tuple[str, str]:
+def _group_key(payload: Dict, email: Optional[str] = None) -> Tuple[str, str]:
     """
     Chave de agrupamento:
       1) Preferir e-mail do fornecedor (domínio/pessoa específica)
       2) Fallback: (Nome do hotel + Cidade)
+    `email` pode vir já calculado por _supplier_email (evita varrer o payload de novo).
     """
-    email = _supplier_email(payload) or ""
+    email = email if email is not None else (_supplier_email(payload) or "")
     if email:
         return ("email", email.lower())
     hotel = (payload.get("Nome do hotel") or "").strip()
@@ -291,56 +432,74 @@ def _group_key(payload: Dict) -> Tuple[str, str]:
     subj = _original_subject(payload)
     return ("subject", _norm(subj))
 
-def _pick_to_email(payloads: List[Dict]) -> Optional[str]:
-    emails = []
-    for p in payloads:
-        e = _supplier_email(p)
-        if e:
-            emails.append(e.lower())
-    if not emails:
-        return None
-    most_common = Counter(emails).most_common(1)[0][0]
-    return most_common
-
-def _pick_supplier_name(payloads: List[Dict]) -> str:
-    # tenta pelo nome do fornecedor/hotel mais frequente
-    names = []
-    for p in payloads:
-        n = _friendly_supplier_name(p)
-        if n:
-            names.append(n)
-    if names:
-        return Counter(names).most_common(1)[0][0]
-    # fallback: Nome do hotel
-    hotels = []
-    for p in payloads:
-        h = (p.get("Nome do hotel") or "").strip()
-        if h:
-            hotels.append(h)
-    if hotels:
-        return Counter(hotels).most_common(1)[0][0]
-    return "parceiro"
-
-def _pick_original_subject(payloads: List[Dict]) -> str:
-    # reusa um assunto representativo
-    subs = []
-    for p in payloads:
-        s = _original_subject(p)
-        if s:
-            subs.append(s)
-    if subs:
-        return subs[0]
-    return "Parrot Trips | Informações pendentes"
-
-def _collect_missing_fields(payloads: List[Dict]) -> List[str]:
-    seen = set()
-    fields: List[str] = []
-    for p in payloads:
-        for f in _get_missing_fields(p):
-            if f not in seen:
-                seen.add(f)
-                fields.append(f)
-    return fields
+def _summarize_payload(payload: Dict) -> Dict:
+    """
+    Reduz o payload ao que o agrupamento e o draft usam. O resumo é pequeno
+    (barato de devolver de um processo worker) e cada varredura roda uma só vez.
+    """
+    email = _supplier_email(payload) or ""
+    return {
+        "key": _group_key(payload, email),
+        "missing_fields": _get_missing_fields(payload),
+        "supplier_email": email.lower(),
+        "friendly_name": _friendly_supplier_name(payload),
+        "hotel": (payload.get("Nome do hotel") or "").strip(),
+        "subject": _original_subject(payload),
+    }
+
+def _has_pending_fields(raw: bytes) -> bool:
+    """
+    Olha os bytes antes do parse: sem a chave _missing_fields (ex.: JSONs de _error)
+    ou com a lista vazia, não há nada a perguntar e o parse completo é dispensado.
+    """
+    if _MISSING_KEY not in raw:
+        return False
+    return not (_EMPTY_MISSING_RE.search(raw) and _MISSING_PER_ITEM_KEY not in raw)
+
+def _load_summary(path: str) -> Tuple[str, Optional[Dict], str]:
+    """
+    (path, resumo, erro) — executado nos workers do ProcessPoolExecutor.
+    Resumo None com erro vazio = arquivo sem campos pendentes (pulado).
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        if not _has_pending_fields(raw):
+            return path, None, ""
+        payload = parse_json_bytes(raw)
+    except Exception as e:
+        return path, None, str(e)
+    return path, _summarize_payload(payload), ""
+
+def _summarize_group(summaries: List[Dict]) -> Dict:
+    """
+    Uma passada pelos resumos do grupo: destinatário e nome mais frequentes,
+    primeiro assunto não vazio e união ordenada dos campos pendentes.
+    """
+    emails: Counter = Counter()
+    names: Counter = Counter()
+    hotels: Counter = Counter()
+    subject = ""
+    missing: Dict[str, None] = {}
+    for s in summaries:
+        if s["supplier_email"]:
+            emails[s["supplier_email"]] += 1
+        if s["friendly_name"]:
+            names[s["friendly_name"]] += 1
+        if s["hotel"]:
+            hotels[s["hotel"]] += 1
+        if not subject and s["subject"]:
+            subject = s["subject"]
+        missing.update(dict.fromkeys(s["missing_fields"]))
+
+    # nome: fornecedor mais frequente → Nome do hotel → genérico
+    name_ctr = names or hotels
+    return {
+        "to_email": emails.most_common(1)[0][0] if emails else None,
+        "supplier_name": name_ctr.most_common(1)[0][0] if name_ctr else "parceiro",
+        "orig_subject": subject or "Parrot Trips | Informações pendentes",
+        "missing_fields": list(missing),
+    }
 
 # -------------------- salvar drafts --------------------
 
@@ -349,7 +508,7 @@ def _save_draft(base_name: str,
                 cc: str,
                 subject: str,
                 body: str) -> Tuple[str, str]:
-    ensure_dir(DRAFTS_DIR)
+    """Grava o draft (.json + .txt) em DRAFTS_DIR, que main() já garantiu existir."""
     json_path = os.path.join(DRAFTS_DIR, f"{base_name}_draft.json")
     txt_path = os.path.join(DRAFTS_DIR, f"{base_name}_draft.txt")
     data = {
@@ -360,100 +519,152 @@ def _save_draft(base_name: str,
         "subject": subject,
         "body": body,
     }
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    with open(txt_path, "w", encoding="utf-8") as f:
-        if to_email:
-            f.write(f"Para: {to_email}\n")
-        if cc:
-            f.write(f"Cc: {cc}\n")
-        f.write(f"Assunto: {subject}\n\n")
-        f.write(body.strip() + "\n")
+    with open(json_path, "wb") as f:
+        f.write(dumps_json_bytes(data, indent=True))
+    txt = (
+        (f"Para: {to_email}\n" if to_email else "")
+        + (f"Cc: {cc}\n" if cc else "")
+        + f"Assunto: {subject}\n\n"
+        + body.strip() + "\n"
+    )
+    with open(txt_path, "wb") as f:
+        f.write(txt.encode("utf-8"))
     return json_path, txt_path
 
 # -------------------- main (agrupado por hotel/fornecedor) --------------------
 
+def _build_group_job(key: Tuple[str, str], summaries: List[Dict]) -> Optional[Dict]:
+    """Consolida perguntas e metadados de um grupo; None se não houver nada a perguntar."""
+    info = _summarize_group(summaries)
+    missing_fields = info["missing_fields"]
+    if not missing_fields:
+        return None
+
+    questions = [question_for_field(f) for f in missing_fields]
+    supplier_name = info["supplier_name"]
+    orig_subject = info["orig_subject"]
+    to_email = info["to_email"]
+
+    prompt_ctx = {
+        "supplier_name": supplier_name,
+        "original_subject": orig_subject,
+        "missing_questions": questions,
+        "from_name": DEFAULT_FROM_NAME,
+    }
+    return {
+        "key": key,
+        "questions": questions,
+        "supplier_name": supplier_name,
+        "orig_subject": orig_subject,
+        "to_email": to_email,
+        "prompt": build_followup_prompt(prompt_ctx),
+        "templated": all(_template_question(f) for f in missing_fields),
+    }
+
+def _write_group_draft(job: Dict, reply: Dict[str, str]) -> Tuple[str, str]:
+    key = job["key"]
+    questions = job["questions"]
+    supplier_name = job["supplier_name"]
+    orig_subject = job["orig_subject"]
+
+    # Subject/body padrão se LLM falhar
+    subject_llm = reply.get("subject") or ""
+    body_llm = (reply.get("body") or "").strip()
+
+    # Subject sugerido se vazio: mantem o contexto e indica consolidação
+    if not subject_llm:
+        base_subj = orig_subject or f"Parrot Trips | {supplier_name}"
+        subject_llm = f"{base_subj} — Informações pendentes (consolidado)"
+
+    if not body_llm:
+        body_llm = (
+            f"Olá {supplier_name or 'time'},\n\n"
+            "Tudo bem? Obrigado pelas cotações enviadas. Durante a conferência, notamos que alguns pontos ficaram pendentes:\n"
+            + "".join(f"- {q}\n" for q in questions) +
+            "\nPoderiam, por favor, nos confirmar essas informações? Agradecemos desde já!\n\n"
+            f"{DEFAULT_FROM_NAME}\nParrot Trips"
+        )
+
+    # Nome de arquivo por grupo (evita duplicar por hotel/fornecedor)
+    if key[0] == "email":
+        base = f"group__by_email__{_slug(key[1])}"
+    elif key[0] == "hotel_city":
+        base = f"group__by_hotelcity__{_slug(key[1])}"
+    else:
+        base = f"group__by_subject__{_slug(key[1])}"
+
+    return _save_draft(
+        base_name=base,
+        to_email=job["to_email"],
+        cc=DEFAULT_CC,
+        subject=subject_llm,
+        body=body_llm,
+    )
+
+def _list_json_files(folder: str) -> List[str]:
+    """*.json do diretório (ordenados); scandir usa o tipo da entrada já lido, sem stat extra."""
+    if not os.path.isdir(folder):
+        return []
+    with os.scandir(folder) as it:
+        return sorted(
+            e.path for e in it
+            if e.name.endswith(".json") and not e.name.startswith(".") and e.is_file()
+        )
+
 def main():
     if not OPENROUTER_API_KEY:
         raise SystemExit("⛔ OPENROUTER_API_KEY não definido no .env")
 
-    files = sorted(glob.glob(os.path.join(INCOMPLETE_DIR, "*.json")))
+    files = _list_json_files(INCOMPLETE_DIR)
     if not files:
         print(f"⛔ Nenhum arquivo .json encontrado em {INCOMPLETE_DIR}/")
         return
 
-    # 1) Carrega e agrupa os payloads por grupo (fornecedor/hotel)
+    # 1) Carrega, resume e agrupa os payloads por grupo (fornecedor/hotel).
+    #    Parsing JSON + varreduras de e-mail são CPU: em lotes grandes, vão para processos;
+    #    nos pequenos, threads sobrepõem a leitura dos arquivos (read/orjson soltam o GIL).
+    if len(files) >= PROCESS_POOL_MIN_FILES:
+        with ProcessPoolExecutor() as pool:
+            loaded = list(pool.map(_load_summary, files, chunksize=16))
+    else:
+        with ThreadPoolExecutor(max_workers=min(32, len(files))) as pool:
+            loaded = list(pool.map(_load_summary, files))
+
     groups: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
     total_payloads = 0
-    for path in files:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                payload = json.load(f)
-            total_payloads += 1
-        except Exception as e:
-            print(f"⚠️ Erro ao ler {os.path.basename(path)}: {e}")
+    for path, summary, err in loaded:
+        if summary is None:
+            if err:
+                print(f"⚠️ Erro ao ler {os.path.basename(path)}: {err}")
             continue
-        key = _group_key(payload)
-        groups[key].append(payload)
+        total_payloads += 1
+        groups[summary["key"]].append(summary)
 
     print(f"✉️  Gerando e-mails de follow-up para {len(groups)} grupo(s) (a partir de {total_payloads} arquivo(s) incompletos)…")
 
+    # 2) Consolida perguntas e metadados (grupos sem pendências ficam de fora)
+    jobs = [job for job in (_build_group_job(k, p) for k, p in groups.items()) if job]
+
+    # 3) Chamadas ao LLM em paralelo; cada draft é gravado assim que sua resposta chega.
+    #    Com SKIP_LLM_IF_ALL_TEMPLATED, grupos só com perguntas prontas vão direto ao texto padrão.
+    ensure_dir(DRAFTS_DIR)
     created = 0
-    for key, payloads in groups.items():
-        # 2) Consolida perguntas e metadados
-        missing_fields = _collect_missing_fields(payloads)
-        if not missing_fields:
-            # nada a perguntar neste grupo
-            continue
 
-        questions = [question_for_field(f) for f in missing_fields]
-        supplier_name = _pick_supplier_name(payloads)
-        orig_subject = _pick_original_subject(payloads)
-        to_email = _pick_to_email(payloads)
-
-        prompt_ctx = {
-            "supplier_name": supplier_name,
-            "original_subject": orig_subject,
-            "missing_questions": questions,
-            "from_name": DEFAULT_FROM_NAME,
-        }
-        reply = _call_llm_followup(build_followup_prompt(prompt_ctx))
-
-        # 3) Subject/body padrão se LLM falhar
-        subject_llm = reply.get("subject") or ""
-        body_llm = (reply.get("body") or "").strip()
-
-        # Subject sugerido se vazio: mantem o contexto e indica consolidação
-        if not subject_llm:
-            base_subj = orig_subject or f"Parrot Trips | {supplier_name}"
-            subject_llm = f"{base_subj} — Informações pendentes (consolidado)"
-
-        if not body_llm:
-            body_llm = (
-                f"Olá {supplier_name or 'time'},\n\n"
-                "Tudo bem? Obrigado pelas cotações enviadas. Durante a conferência, notamos que alguns pontos ficaram pendentes:\n"
-                + "".join(f"- {q}\n" for q in questions) +
-                "\nPoderiam, por favor, nos confirmar essas informações? Agradecemos desde já!\n\n"
-                f"{DEFAULT_FROM_NAME}\nParrot Trips"
-            )
-
-        # 4) Nome de arquivo por grupo (evita duplicar por hotel/fornecedor)
-        if key[0] == "email":
-            base = f"group__by_email__{_slug(key[1])}"
-        elif key[0] == "hotel_city":
-            base = f"group__by_hotelcity__{_slug(key[1])}"
-        else:
-            base = f"group__by_subject__{_slug(key[1])}"
-
-        jpath, tpath = _save_draft(
-            base_name=base,
-            to_email=to_email,
-            cc=DEFAULT_CC,
-            subject=subject_llm,
-            body=body_llm,
-        )
+    def _write(job: Dict, reply: Dict[str, str]) -> None:
+        nonlocal created
+        jpath, tpath = _write_group_draft(job, reply)
         created += 1
-        print(f"✅ Draft criado (grupo): {os.path.basename(jpath)} | {os.path.basename(tpath)}  → To: {to_email or '(vazio)'}")
+        print(f"✅ Draft criado (grupo): {os.path.basename(jpath)} | {os.path.basename(tpath)}  → To: {job['to_email'] or '(vazio)'}")
+
+    llm_jobs = []
+    for job in jobs:
+        if SKIP_LLM_IF_ALL_TEMPLATED and job["templated"]:
+            _write(job, {"subject": "", "body": ""})
+        else:
+            llm_jobs.append(job)
+
+    for i, reply in _iter_llm_followups([job["prompt"] for job in llm_jobs]):
+        _write(llm_jobs[i], reply)
 
     print(f"🏁 Pronto! {created} draft(s) consolidado(s) em {DRAFTS_DIR}/")
 
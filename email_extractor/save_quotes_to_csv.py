@@ -14,6 +14,9 @@ Como configurar o limite de limpeza (linhas inspecionadas a partir do topo):
 - Via CLI:   --clean-limit 200     (padrão 200)
 - Via .env:  CLEAN_LIMIT=200
 
+Linhas já enviadas em execuções anteriores (hash em .cache/sent_rows.sqlite)
+são puladas; use --resend-all para enviar tudo de novo.
+
 Requisitos:
 - .env com SHEET_ID (e opcional CLEAN_LIMIT)
 - Credencial em ../credentials/sheets-parrots.json
@@ -21,8 +24,11 @@ Requisitos:
 
 import os
 import sys
-import json
+import sqlite3
+import hashlib
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from typing import List, Dict, Any, Tuple
 from dotenv import load_dotenv
 
@@ -31,6 +37,7 @@ sys.path.append("..")
 load_dotenv("../.env")
 
 from modules.headers import HEADER_FIELDS
+from modules.json_utils import load_json_file
 from modules.login_sheets import open_spreadsheet_by_id, open_worksheet, get_first_row
 
 # Pastas
@@ -41,44 +48,48 @@ INCOMPLETE_DIR = "incomplete_data"
 CREDENTIALS_PATH = "../credentials/sheets-parrots.json"
 WORKSHEET_ALL = "quotes"
 
+# Ordem das colunas congelada em tupla (iterada por linha em _dict_to_row)
+_HF = tuple(HEADER_FIELDS)
 
-# ----------------- utilidades básicas -----------------
+# Hashes das linhas já enviadas (evita reenviar as mesmas linhas a cada execução)
+SENT_DB_PATH = os.path.join(".cache", "sent_rows.sqlite")
 
-def _normalize_obj_to_header(obj: Dict[str, Any]) -> Dict[str, Any]:
-    """Mantém somente HEADER_FIELDS e garante '' para ausentes/None."""
-    return {k: ("" if obj.get(k, "") is None else obj.get(k, "")) for k in HEADER_FIELDS}
 
+# ----------------- utilidades básicas -----------------
 
 def _dict_to_row(d: Dict[str, Any]) -> List[str]:
     """Valores na ordem exata de HEADER_FIELDS (sempre str/'' )."""
-    return [str(d.get(k, "")) if d.get(k, "") is not None else "" for k in HEADER_FIELDS]
+    return [("" if (v := d.get(k)) is None else str(v)) for k in _HF]
 
 
-def _collect_from_folder(folder: str) -> List[Dict[str, Any]]:
-    """Lê todos os .json (objeto único ou lista) e normaliza."""
-    rows: List[Dict[str, Any]] = []
+def _read_one(fpath: str) -> List[List[str]]:
+    """Lê um .json (objeto único ou lista) e devolve as linhas já na ordem de HEADER_FIELDS."""
+    try:
+        data = load_json_file(fpath)
+    except Exception as e:
+        print(f"⚠️  Erro lendo '{fpath}': {e}")
+        return []
+
+    if isinstance(data, dict):
+        return [_dict_to_row(data)]
+    if isinstance(data, list):
+        return [_dict_to_row(item) for item in data if isinstance(item, dict)]
+    return []
+
+
+def _collect_from_folder(folder: str) -> List[List[str]]:
+    """Lê todos os .json (objeto único ou lista) e converte direto em linhas da planilha."""
     if not os.path.isdir(folder):
-        return rows
-
-    files = sorted(
-        f for f in (os.path.join(folder, x) for x in os.listdir(folder))
-        if os.path.isfile(f) and f.lower().endswith(".json")
-    )
-    for fpath in files:
-        try:
-            with open(fpath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"⚠️  Erro lendo '{fpath}': {e}")
-            continue
+        return []
 
-        if isinstance(data, dict):
-            rows.append(_normalize_obj_to_header(data))
-        elif isinstance(data, list):
-            for item in data:
-                if isinstance(item, dict):
-                    rows.append(_normalize_obj_to_header(item))
-    return rows
+    # scandir traz o tipo da entrada junto da listagem: sem stat() extra por arquivo
+    with os.scandir(folder) as it:
+        files = sorted(e.path for e in it if e.name.lower().endswith(".json") and e.is_file())
+    if not files:
+        return []
+    # Leitura em threads (read/orjson liberam o GIL); map preserva a ordem dos arquivos
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4, len(files))) as ex:
+        return list(chain.from_iterable(ex.map(_read_one, files)))
 
 
 # ----------------- escrita na planilha -----------------
@@ -91,7 +102,7 @@ def _ensure_header(ws) -> None:
         print(f"🧭 Cabeçalho criado na aba '{WORKSHEET_ALL}'.")
         return
 
-    normalized_sheet = [c.strip() for c in first_row[:len(HEADER_FIELDS)]]
+    normalized_sheet = [c.strip() for c in first_row[:_NCOLS]]
     if normalized_sheet != HEADER_FIELDS:
         ws.update(range_name="A1", values=[HEADER_FIELDS])
         print(f"ℹ️  Cabeçalho da aba '{WORKSHEET_ALL}' foi atualizado para HEADER_FIELDS atual.")
@@ -106,108 +117,116 @@ def _col_letter(idx: int) -> str:
     return s
 
 
-def _detect_first_gap(ws, ncols: int) -> Tuple[int, int]:
+# Número de colunas e última coluna (constantes: dependem só de HEADER_FIELDS)
+_NCOLS = len(HEADER_FIELDS)
+_END_COL = _col_letter(_NCOLS)
+
+
+def _detect_first_gap(ws) -> Tuple[int, int, int]:
     """
     Detecta o primeiro buraco interno (todas as células vazias de A..ncols).
-    Retorna (linha_inicio_gap, linha_primeira_usada_abaixo).
-    - Se não houver gap, retorna (len(vals)+1, 0): escrever no final.
+    Retorna (linha_inicio_gap, linha_primeira_usada_abaixo, última_linha_com_dados).
+    - Se não houver gap, retorna (última+1, 0, última): escrever no final.
+    A coluna A só escolhe as candidatas (A pode ficar vazia em linhas com dados, ex.: falhas
+    sem Timestamp); cada candidata é confirmada em A..ncols num único batch_get.
     """
-    vals = ws.get_all_values()
-    if not vals:
-        return 2, 0
-    if len(vals) == 1:
-        return 2, 0
-
-    start_gap, next_used = 0, 0
-    for i in range(1, len(vals)):  # começa da linha 2 (index 1)
-        row = vals[i] if i < len(vals) else []
-        padded = (row + [""] * ncols)[:ncols]
-        is_empty = all((cell or "").strip() == "" for cell in padded)
-        if is_empty and start_gap == 0:
-            start_gap = i + 1  # número da linha
-        if (not is_empty) and start_gap != 0:
-            next_used = i + 1
-            break
-
-    if start_gap == 0:
-        return len(vals) + 1, 0
-    return start_gap, next_used  # se next_used==0, gap vai até o fim
-
-
-def _update_block(ws, start_row: int, rows: List[List[str]]):
-    if not rows:
-        return
-    end_col = _col_letter(len(HEADER_FIELDS))
-    r1 = start_row
-    r2 = start_row + len(rows) - 1
-    ws.update(range_name=f"A{r1}:{end_col}{r2}", values=rows, value_input_option="USER_ENTERED")
+    col_a = ws.col_values(1)
+    base = max(len(col_a), 1)
+    # col_values corta as células vazias do fim: linhas abaixo podem ter dados em outras colunas
+    tail = ws.get(f"A{base + 1}:{_END_COL}", value_render_option="FORMATTED_VALUE") or []
+    tail = [row[:_NCOLS] for row in tail]
+    while tail and _is_row_empty(tail[-1]):
+        tail.pop()
+    last_row = base + len(tail)
+
+    empty_rows = set()
+    candidates = [i for i in range(2, len(col_a) + 1) if not (col_a[i - 1] or "").strip()]
+    if candidates:
+        blocks = _group_consecutive(candidates)
+        fetched = ws.batch_get([f"A{start}:{_END_COL}{end}" for start, end in blocks],
+                               value_render_option="FORMATTED_VALUE")
+        for (start, end), data in zip(blocks, fetched):
+            for i in range(start, end + 1):
+                idx = i - start
+                if _is_row_empty((data[idx] if idx < len(data) else [])[:_NCOLS]):
+                    empty_rows.add(i)
+    empty_rows.update(base + 1 + j for j, row in enumerate(tail) if _is_row_empty(row))
+
+    if not empty_rows:
+        return last_row + 1, 0, last_row
+    start_gap = min(empty_rows)
+    next_used = start_gap
+    while next_used in empty_rows:
+        next_used += 1
+    if next_used > last_row:
+        return start_gap, 0, last_row  # gap vai até o fim
+    return start_gap, next_used, last_row
+
+
+def _block(start_row: int, rows: List[List[str]]) -> Dict:
+    """Um intervalo A{r1}:{fim}{r2} no formato de values.batchUpdate."""
+    return {"range": f"A{start_row}:{_END_COL}{start_row + len(rows) - 1}", "values": rows}
+
+
+def _write_blocks(ws, blocks: List[Dict], max_rows: int = 5000):
+    """
+    Grava vários intervalos com values.batchUpdate: uma requisição por até `max_rows` linhas,
+    em vez de um update por bloco. Mantém USER_ENTERED: com RAW, preço e datas virariam texto.
+    """
+    total = sum(len(b["values"]) for b in blocks)
+    sent, batch, batch_rows = 0, [], 0
+    for b in blocks + [None]:
+        if batch and (b is None or batch_rows + len(b["values"]) > max_rows):
+            ws.batch_update(batch, value_input_option="USER_ENTERED")
+            sent += batch_rows
+            print(f"➡️  Enviado(s) {sent}/{total} linha(s)...")
+            batch, batch_rows = [], 0
+        if b is not None:
+            batch.append(b)
+            batch_rows += len(b["values"])
 
 
-def _append_without_gaps(ws, dict_rows: List[Dict[str, Any]], chunk_size: int = 200):
+def _append_without_gaps(ws, rows: List[List[str]], chunk_size: int = 200):
     """
     Estratégia existente: tenta preencher o primeiro gap interno; se sobrar, continua no final.
     (Mantida a pedido; a limpeza de linhas vazias virá DEPOIS desta escrita.)
+    Os blocos de `chunk_size` linhas vão juntos em values.batchUpdate.
     """
-    if not dict_rows:
+    if not rows:
         return
 
     _ensure_header(ws)
 
-    ncols = len(HEADER_FIELDS)
-    rows = [_dict_to_row(d) for d in dict_rows]
-
-    start_gap, next_used = _detect_first_gap(ws, ncols)
+    start_gap, next_used, last_row = _detect_first_gap(ws)
 
     # Sem gap interno (ou gap até o fim) → escreve tudo a partir de start_gap
     if next_used == 0:
-        total, sent = len(rows), 0
-        while sent < total:
-            chunk = rows[sent:sent + chunk_size]
-            _update_block(ws, start_gap + sent, chunk)
-            sent += len(chunk)
-            print(f"➡️  Enviado(s) {sent}/{total} linha(s)...")
-        return
+        first_part, rest_part = rows, []
+    else:
+        # Gap limitado: [start_gap .. next_used-1]; o restante vai para o final atual
+        gap_size = max(0, next_used - start_gap)
+        first_part, rest_part = rows[:gap_size], rows[gap_size:]
+
+    blocks = [_block(start_gap + i, first_part[i:i + chunk_size]) for i in range(0, len(first_part), chunk_size)]
+    # o gap era interno: o fim dos dados (em A..ncols) não mudou, sem nova leitura da aba
+    start_tail = last_row + 1
+    blocks += [_block(start_tail + i, rest_part[i:i + chunk_size]) for i in range(0, len(rest_part), chunk_size)]
+    _write_blocks(ws, blocks)
+
 
-    # Gap limitado: [start_gap .. next_used-1]
-    gap_size = max(0, next_used - start_gap)
-    first_part = rows[:gap_size]
-    rest_part = rows[gap_size:]
-
-    # 1) Preenche o gap
-    total_gap, sent_gap = len(first_part), 0
-    while sent_gap < total_gap:
-        chunk = first_part[sent_gap:sent_gap + chunk_size]
-        _update_block(ws, start_gap + sent_gap, chunk)
-        sent_gap += len(chunk)
-        print(f"➡️  (gap) Enviado(s) {sent_gap}/{total_gap} linha(s)...")
-
-    # 2) O restante vai para o final atual
-    if rest_part:
-        vals_after = ws.get_all_values()
-        start_tail = len(vals_after) + 1
-        total_tail, sent_tail = len(rest_part), 0
-        while sent_tail < total_tail:
-            chunk = rest_part[sent_tail:sent_tail + chunk_size]
-            _update_block(ws, start_tail + sent_tail, chunk)
-            sent_tail += len(chunk)
-            print(f"➡️  (final) Enviado(s) {sent_tail}/{total_tail} linha(s)...")
-
-
-def _append_all_to_sheet(sheet, worksheet_name: str, dict_rows: List[Dict[str, Any]]):
+def _append_all_to_sheet(sheet, worksheet_name: str, rows: List[List[str]]):
     """Abre aba, garante cabeçalho e grava todas as linhas."""
     ws = open_worksheet(sheet, worksheet_name)
-    _append_without_gaps(ws, dict_rows, chunk_size=200)
-    print(f"✅ Inseridas {len(dict_rows)} linha(s) na aba '{worksheet_name}'.")
+    _append_without_gaps(ws, rows, chunk_size=200)
+    print(f"✅ Inseridas {len(rows)} linha(s) na aba '{worksheet_name}'.")
     return ws
 
 
 # ----------------- limpeza de linhas vazias -----------------
 
-def _pad_trim(row: List[str], ncols: int) -> List[str]:
-    return (row + [""] * ncols)[:ncols]
-
 def _is_row_empty(row: List[str]) -> bool:
-    return all((c or "").strip() == "" for c in row)
+    # um join em C no lugar do all() célula a célula
+    return not "".join(row).strip()
 
 def _col_range(ncols: int) -> str:
     return f"A:{_col_letter(ncols)}"
@@ -233,55 +252,117 @@ def remove_blank_rows(ws, scan_limit: int, ncols: int) -> int:
     Varre da linha 2 até 'scan_limit' (inclusive) e remove linhas 100% vazias
     (todas as colunas A..ncols em branco). Retorna quantidade de linhas removidas.
 
-    Observação: deleta em ordem reversa por blocos para evitar alteração de índices.
+    Observação: deleta em ordem reversa por blocos (num único batchUpdate) para evitar alteração de índices.
     """
     scan_limit = max(2, int(scan_limit))
     end_col = _col_letter(ncols)
-    # Range explícito preserva células vazias como "" no retorno
-    data = ws.get(f"A2:{end_col}{scan_limit}", value_render_option="FORMATTED_VALUE")
-    # data é uma matriz com (scan_limit-1) linhas; se a sheet for menor, gspread
-    # geralmente retorna linhas faltantes como [] -> tratamos como vazias.
 
+    # 1ª fase (barata): só a coluna A. Linhas com A preenchida não estão vazias.
+    col_a = ws.get(f"A2:A{scan_limit}", value_render_option="FORMATTED_VALUE")
+    # linhas faltantes no fim voltam ausentes/[] -> candidatas
+    candidates = [
+        i for i in range(2, scan_limit + 1)
+        if _is_row_empty(col_a[i - 2] if i - 2 < len(col_a) else [])
+    ]
+
+    # 2ª fase: confirma as candidatas lendo A..ncols só desses blocos (um batch_get)
     empty_rows_abs: List[int] = []
-    for i in range(2, scan_limit + 1):
-        idx = i - 2  # índice dentro de 'data'
-        row = data[idx] if idx < len(data) else []
-        row = _pad_trim(row, ncols)
-        if _is_row_empty(row):
-            empty_rows_abs.append(i)
+    if candidates:
+        blocks = _group_consecutive(candidates)
+        fetched = ws.batch_get([f"A{start}:{end_col}{end}" for start, end in blocks],
+                               value_render_option="FORMATTED_VALUE")
+        for (start, end), data in zip(blocks, fetched):
+            for i in range(start, end + 1):
+                idx = i - start  # índice dentro do bloco
+                row = data[idx] if idx < len(data) else []
+                # padding com "" não muda o resultado: só corta se vier além de ncols
+                if len(row) > ncols:
+                    row = row[:ncols]
+                if _is_row_empty(row):
+                    empty_rows_abs.append(i)
 
     if not empty_rows_abs:
         print(f"🧼 Sem linhas 100% vazias entre A2 e A{scan_limit}.")
         return 0
 
-    # Deletar em blocos (menos chamadas à API)
-    ranges = _group_consecutive(empty_rows_abs)
+    # Todos os blocos em um único batchUpdate (1 chamada à API). Os pedidos vão de baixo
+    # para cima e o Sheets os aplica em ordem, então os índices não se deslocam entre eles.
+    ranges = list(reversed(_group_consecutive(empty_rows_abs)))
+    requests = [
+        {"deleteDimension": {"range": {
+            "sheetId": ws.id, "dimension": "ROWS",
+            "startIndex": start - 1, "endIndex": end,  # 0-based, fim exclusivo
+        }}}
+        for start, end in ranges
+    ]
     deleted = 0
-    for start, end in reversed(ranges):
-        try:
-            ws.delete_rows(start, end)
+    try:
+        ws.spreadsheet.batch_update({"requests": requests})
+        for start, end in ranges:
             deleted += (end - start + 1)
             print(f"🗑️  Removidas linhas {start}–{end}.")
-        except Exception as e:
-            print(f"⚠️  Falha ao remover linhas {start}–{end}: {e}")
+    except Exception as e:
+        print(f"⚠️  Falha ao remover linhas vazias ({len(ranges)} bloco(s)): {e}")
 
     print(f"✅ Limpeza concluída: {deleted} linha(s) vazia(s) removida(s) no topo (até {scan_limit}).")
     return deleted
 
 
+# ----------------- linhas já enviadas -----------------
+
+def _row_hash(row: List[str]) -> int:
+    """Hash de 64 bits da linha (cabe no INTEGER do SQLite)."""
+    digest = hashlib.blake2b("\x00".join(row).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _open_sent_db(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS sent (h INTEGER PRIMARY KEY)")
+    return conn
+
+
+# Hashes por consulta IN (...): abaixo do limite de parâmetros do SQLite (999 nas versões antigas)
+_SENT_QUERY_CHUNK = 500
+
+
+def _filter_unsent(conn: sqlite3.Connection, rows: List[List[str]]) -> Tuple[List[List[str]], List[int]]:
+    """Remove linhas repetidas no lote e as já enviadas antes; devolve (linhas, hashes)."""
+    by_hash: Dict[int, List[str]] = {}
+    for row in rows:
+        by_hash.setdefault(_row_hash(row), row)
+    # consulta só os hashes desta execução (pela PRIMARY KEY), não o histórico inteiro
+    hashes = list(by_hash)
+    sent = set()
+    for i in range(0, len(hashes), _SENT_QUERY_CHUNK):
+        chunk = hashes[i:i + _SENT_QUERY_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        sent.update(h for (h,) in conn.execute(f"SELECT h FROM sent WHERE h IN ({marks})", chunk))
+    fresh = [(h, row) for h, row in by_hash.items() if h not in sent]
+    return [row for _, row in fresh], [h for h, _ in fresh]
+
+
+def _mark_sent(conn: sqlite3.Connection, hashes: List[int]) -> None:
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO sent (h) VALUES (?)", ((h,) for h in hashes))
+
+
 # ----------------- main -----------------
 
 def main():
     parser = argparse.ArgumentParser(description="Envia dados ao Google Sheets e limpa linhas vazias no topo.")
     parser.add_argument("--clean-limit", type=int, default=int(os.getenv("CLEAN_LIMIT", "200")),
                         help="Máximo de linhas a inspecionar a partir do topo (A2..A{N}) para remoção de linhas totalmente vazias. Padrão=200.")
+    parser.add_argument("--resend-all", action="store_true",
+                        help="Ignora o histórico local e envia todas as linhas, mesmo as já enviadas.")
     args = parser.parse_args()
 
     SHEET_ID = os.getenv("SHEET_ID", "").strip()
     if not SHEET_ID:
         raise SystemExit("⛔ SHEET_ID não definido no .env")
 
-    all_rows: List[Dict[str, Any]] = []
+    all_rows: List[List[str]] = []
     all_rows.extend(_collect_from_folder(COMPLETE_DIR))
     all_rows.extend(_collect_from_folder(INCOMPLETE_DIR))
 
@@ -289,11 +370,30 @@ def main():
         print("⛔ Nada para enviar: nenhuma linha encontrada em 'complete_data/' ou 'incomplete_data/'.")
         return
 
-    sh = open_spreadsheet_by_id(SHEET_ID, CREDENTIALS_PATH)
-    ws = _append_all_to_sheet(sh, WORKSHEET_ALL, all_rows)
+    conn = _open_sent_db(SENT_DB_PATH)
+    try:
+        if args.resend_all:
+            hashes = [_row_hash(row) for row in all_rows]
+        else:
+            total = len(all_rows)
+            all_rows, hashes = _filter_unsent(conn, all_rows)
+            if total != len(all_rows):
+                print(f"⏭️  {total - len(all_rows)} linha(s) já enviada(s)/repetida(s) puladas.")
+
+        sh = open_spreadsheet_by_id(SHEET_ID, CREDENTIALS_PATH)
+        if all_rows:
+            ws = _append_all_to_sheet(sh, WORKSHEET_ALL, all_rows)
+            # só marca como enviadas depois que a escrita na planilha terminou
+            _mark_sent(conn, hashes)
+        else:
+            # nada novo: ainda abre a aba para a limpeza abaixo rodar como sempre
+            print("✅ Nada novo para enviar.")
+            ws = open_worksheet(sh, WORKSHEET_ALL)
+    finally:
+        conn.close()
 
     # limpeza de linhas em branco no topo (A2..A{clean-limit})
-    ncols = len(HEADER_FIELDS)
+    ncols = _NCOLS
     remove_blank_rows(ws, scan_limit=args.clean_limit, ncols=ncols)
 
 
@@ -7,9 +7,25 @@ from __future__ import annotations
 
 import os
 import re
+import time
+import random
 import argparse
 import unicodedata
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
+
+try:
+    import ahocorasick  # opcional: pyahocorasick (todas as palavras-chave numa passada)
+except ImportError:
+    ahocorasick = None
+
+try:
+    # opcional: parser HTML em C (corpos grandes); lexbor no selectolax >= 1.0, modest nas versões antigas
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
 
 # --- bootstrap: garantir que a raiz do repo está no sys.path ---
 import sys
@@ -18,10 +34,6 @@ ROOT = Path(__file__).resolve().parents[1]      # .../louro-jose
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from googleapiclient.errors import HttpError
-# agora este import funciona independente do CWD
-from modules.login_gmail import create_login
-
 # =========================
 # Configuração (ajustável)
 # =========================
@@ -39,8 +51,15 @@ TOKEN_PATH = str(Path(TOKEN_DIR) / "token_gmail_v1.json")
 DEFAULT_QUERY = "newer_than:60d in:anywhere"
 DEFAULT_LABEL = os.getenv("QUOTES_LABEL_NAME", "QUOTES")
 
+# Pré-filtro no servidor (--prefilter): só baixa threads com ao menos um destes termos
+PREFILTER_TERMS = [
+    "cotacao", "cotação", "orcamento", "orçamento", "tarifa", "tarifas",
+    "diaria", "diária", "diarias", "diárias", "disponibilidade", "BRL", "USD",
+]
+
 # Heurísticas (palavras, padrões, limiar)
-KEYWORDS = [
+# Palavras-chave como escritas; KEYWORDS (abaixo) é a versão normalizada e sem duplicatas
+_RAW_KEYWORDS = [
     "cotacao", "orçamento", "orcamento", "quote", "quotation", "proposal",
     "tarifa", "tarifas", "diaria", "diárias", "diarias", "disponibilidade",
     "sgl", "dbl", "twin", "triplo", "standard", "luxo", "superior",
@@ -64,10 +83,21 @@ HEURISTIC_THRESHOLD = 3  # pontuação mínima para considerar "cotação"
 def _ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
+# acentos do português (já em minúsculas) -> letra base; resolve o caso comum sem NFD
+_ACCENT_MAP = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüçñ", "aaaaaeeeeiiiiooooouuuucn")
+
 def _normalize_text(s: str) -> str:
     s = (s or "").lower()
-    s = "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
-    return s
+    if s.isascii():
+        return s
+    s = s.translate(_ACCENT_MAP)
+    if s.isascii():
+        return s
+    # sobrou algo fora da tabela: caminho genérico (NFD + remove marcas combinantes)
+    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+
+# O texto é comparado já normalizado: variantes com/sem acento viram a mesma chave
+KEYWORDS = sorted({_normalize_text(k) for k in _RAW_KEYWORDS})
 
 # =========================
 # Gmail: labels
@@ -102,34 +132,40 @@ def _decode_b64url(data: str) -> bytes:
     import base64 as _b64
     return _b64.urlsafe_b64decode(data.encode("utf-8"))
 
-def _flatten_payload(payload: Dict) -> List[Tuple[str, bytes]]:
-    results: List[Tuple[str, bytes]] = []
+_TEXT_MIMES = ("text/plain", "text/html")
+
+def _iter_text_parts(payload: Dict) -> Iterator[Tuple[str, bytes]]:
+    """
+    Percorre a árvore MIME (pré-ordem) e decodifica só as partes text/plain e text/html;
+    anexos e imagens nunca passam pelo base64.
+    """
     if not payload:
-        return results
+        return
     mime = payload.get("mimeType", "")
-    body = payload.get("body", {})
-    data = body.get("data")
-    parts = payload.get("parts")
-    if data:
-        results.append((mime, _decode_b64url(data)))
-    if parts:
-        for p in parts:
-            results.extend(_flatten_payload(p))
-    return results
+    data = payload.get("body", {}).get("data")
+    if data and mime.startswith(_TEXT_MIMES):
+        yield mime, _decode_b64url(data)
+    for p in payload.get("parts") or ():
+        yield from _iter_text_parts(p)
+
+_HTML_SCRIPT_RE = re.compile(r"<(script|style).*?>.*?</\1>", re.I | re.S)
+_HTML_TAG_RE = re.compile(r"<[^>]+>", re.S)
+_WS_RE = re.compile(r"\s+")
 
 def _strip_html(html: str) -> str:
-    html = re.sub(r"(?is)<(script|style).*?>.*?</\1>", " ", html)
-    html = re.sub(r"(?s)<[^>]+>", " ", html)
+    if HTMLParser is not None:
+        tree = HTMLParser(html)
+        tree.strip_tags(["script", "style"])
+        root = tree.body or tree.root
+        return " ".join(root.text(separator=" ").split()) if root is not None else ""
+    html = _HTML_SCRIPT_RE.sub(" ", html)
+    html = _HTML_TAG_RE.sub(" ", html)
     html = html.replace("&nbsp;", " ").replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
-    return re.sub(r"\s+", " ", html).strip()
+    return _WS_RE.sub(" ", html).strip()
 
 def get_plain_text_from_message(msg: Dict) -> str:
-    payload = msg.get("payload", {})
-    parts = _flatten_payload(payload)
-    if not parts and payload.get("body", {}).get("data"):
-        parts = [(payload.get("mimeType", "text/plain"), _decode_b64url(payload["body"]["data"]))]
     texts: List[str] = []
-    for mime, data_bytes in parts:
+    for mime, data_bytes in _iter_text_parts(msg.get("payload", {})):
         if not data_bytes:
             continue
         try:
@@ -152,23 +188,55 @@ def get_header(msg: Dict, name: str) -> str:
 # Heurística de "cotação"
 # =========================
 
+def _build_keyword_automaton():
+    """Autômato Aho-Corasick com KEYWORDS (uma passada no texto); None sem pyahocorasick."""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for kw in KEYWORDS:
+        automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return automaton
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+def _count_keywords(text: str, cap: int) -> int:
+    """Quantas palavras-chave DISTINTAS aparecem no texto (satura em `cap`)."""
+    found = set()
+    if _KEYWORD_AUTOMATON is not None:
+        for _, kw in _KEYWORD_AUTOMATON.iter(text):
+            found.add(kw)
+            if len(found) == cap:
+                break
+        return len(found)
+    # fallback: um teste de substring por palavra-chave
+    for kw in KEYWORDS:
+        if kw in text:
+            found.add(kw)
+            if len(found) == cap:
+                break
+    return len(found)
+
 def looks_like_quote(subject: str, body: str, threshold: int = HEURISTIC_THRESHOLD) -> bool:
     subj_n = _normalize_text(subject)
     body_n = _normalize_text(body)
     text = subj_n + "\n" + body_n
 
     score = 0
-    if CURRENCY_RE.search(text):
+    # uma busca só: o resultado serve tanto para a pontuação quanto para a penalidade abaixo.
+    # Teste de substring antes do regex: o texto já vem em minúsculas, então os ramos
+    # BRL/USD do CURRENCY_RE nunca casam e só "$" (R$ ou $) importa; sem ele não há match.
+    has_currency = "$" in text and CURRENCY_RE.search(text) is not None
+    if has_currency:
         score += 2
-    if PERCENT_RE.search(text):
+    if "%" in text and PERCENT_RE.search(text):
         score += 1
     if DATE_HINT_RE.search(text):
         score += 1
 
-    kw_hits = sum(1 for kw in KEYWORDS if kw in text)
-    score += min(kw_hits, 3)
+    score += _count_keywords(text, cap=3)
 
-    if not CURRENCY_RE.search(text):
+    if not has_currency:
         if body.count("?") >= 3:
             score -= 1
 
@@ -185,39 +253,96 @@ def thread_has_label(thread: Dict, label_id: str) -> bool:
             return True
     return False
 
-def add_label_to_thread(service, thread_id: str, label_id: str) -> None:
-    service.users().threads().modify(
-        userId="me", id=thread_id, body={"addLabelIds": [label_id], "removeLabelIds": []}
-    ).execute()
+# messages.batchModify aceita até 1000 ids por chamada
+BATCH_MODIFY_MAX = 1000
+
+# Erros transitórios do Gmail (rate limit / instabilidade): vale tentar de novo
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+def _execute_with_retry(request, max_retries: int = 5):
+    """request.execute() com backoff exponencial (jitter, teto 30s) só em 429/5xx; outros erros sobem na hora."""
+    for attempt in range(1, max_retries + 1):
+        try:
+            return request.execute()
+        except Exception as e:
+            status = getattr(getattr(e, "resp", None), "status", None)
+            if attempt == max_retries or status not in RETRYABLE_STATUS:
+                raise
+            delay = random.uniform(0, min(30.0, 2.0 ** attempt))
+            print(f"⚠️  Gmail HTTP {status} (tentativa {attempt}/{max_retries}). Retentando em {delay:.1f}s...")
+            time.sleep(delay)
+
+def add_label_to_messages(service, message_ids: List[str], label_id: str) -> None:
+    """Rotula as mensagens em lotes de até BATCH_MODIFY_MAX (1 chamada por lote)."""
+    for i in range(0, len(message_ids), BATCH_MODIFY_MAX):
+        _execute_with_retry(service.users().messages().batchModify(
+            userId="me",
+            body={"ids": message_ids[i:i + BATCH_MODIFY_MAX], "addLabelIds": [label_id], "removeLabelIds": []},
+        ))
 
 # =========================
 # Pipeline principal
 # =========================
 
-def process_threads(service, q: str, label_id: str) -> Dict[str, int]:
-    stats = {"threads": 0, "messages": 0, "threads_labeled": 0}
-    for th_id in search_thread_ids(service, q):
-        stats["threads"] += 1
-        thread = service.users().threads().get(userId="me", id=th_id, format="full").execute()
-
-        # Pule threads já rotuladas para evitar retrabalho
-        if thread_has_label(thread, label_id):
-            continue
+# Só o que a heurística usa: ids/labels, cabeçalhos e corpos (sem metadados extras da API)
+THREAD_FIELDS = "messages(id,labelIds,payload(headers,mimeType,body/data,parts))"
 
-        # Varra as mensagens; ao primeiro match, rotule a thread toda e vá para a próxima
-        labeled_this_thread = False
-        for msg in thread.get("messages", []):
-            stats["messages"] += 1
-            subject = get_header(msg, "Subject")
-            body_text = get_plain_text_from_message(msg)
-            if looks_like_quote(subject, body_text):
-                add_label_to_thread(service, th_id, label_id)
-                stats["threads_labeled"] += 1
-                labeled_this_thread = True
-                break
+def _exclude_label_query(q: str, label_name: str) -> str:
+    """Acrescenta -label:<rótulo> à busca: threads já rotuladas nem chegam a ser baixadas."""
+    return f"{q} -label:{label_name.replace(' ', '-')}".strip()
 
-        # (opcional) poderia logar algo aqui se quiser saber quais não bateram
+def _prefilter_query(q: str, terms: List[str]) -> str:
+    """Acrescenta (t1 OR t2 ...) à busca; termos com espaço vão entre aspas."""
+    terms = [t.strip() for t in terms if t and t.strip()]
+    if not terms:
+        return q
+    ored = " OR ".join(f'"{t}"' if " " in t else t for t in terms)
+    return f"{q} ({ored})".strip()
 
+def process_threads(service, q: str, label_id: str, label_name: str = "") -> Dict[str, int]:
+    stats = {"threads": 0, "messages": 0, "threads_labeled": 0}
+    pending: List[str] = []  # ids de mensagens a rotular no próximo batchModify
+    pending_threads = 0      # threads cujos ids estão em `pending` (só contam após o envio)
+
+    def flush() -> None:
+        nonlocal pending, pending_threads
+        if pending:
+            add_label_to_messages(service, pending, label_id)
+            stats["threads_labeled"] += pending_threads
+        pending, pending_threads = [], 0
+
+    if label_name:
+        q = _exclude_label_query(q, label_name)
+    # finally: se uma thread posterior falhar, os rótulos já decididos ainda são enviados
+    try:
+        for th_id in search_thread_ids(service, q):
+            stats["threads"] += 1
+            thread = _execute_with_retry(service.users().threads().get(
+                userId="me", id=th_id, format="full", fields=THREAD_FIELDS
+            ))
+
+            # Pule threads já rotuladas para evitar retrabalho (a busca já exclui a maioria)
+            if thread_has_label(thread, label_id):
+                continue
+
+            # Varra as mensagens; ao primeiro match, marque a thread toda (todas as mensagens)
+            # e vá para a próxima. O rótulo sai em lote via batchModify.
+            messages = thread.get("messages", [])
+            for msg in messages:
+                stats["messages"] += 1
+                subject = get_header(msg, "Subject")
+                body_text = get_plain_text_from_message(msg)
+                if looks_like_quote(subject, body_text):
+                    pending.extend(m["id"] for m in messages if m.get("id"))
+                    pending_threads += 1
+                    break
+
+            if len(pending) >= BATCH_MODIFY_MAX:
+                flush()
+
+            # (opcional) poderia logar algo aqui se quiser saber quais não bateram
+    finally:
+        flush()
     return stats
 
 # =========================
@@ -232,8 +357,19 @@ def main():
                         help=f"Consulta Gmail para filtrar threads (padrão: '{DEFAULT_QUERY}').")
     parser.add_argument("--label", type=str, default=DEFAULT_LABEL,
                         help=f"Nome do rótulo a aplicar (padrão: '{DEFAULT_LABEL}').")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Filtra no próprio Gmail por termos típicos de cotação antes de baixar as threads.")
+    parser.add_argument("--extra-terms", type=str, default="",
+                        help="Termos extras (separados por vírgula) somados ao OR do pré-filtro.")
     args = parser.parse_args()
 
+    terms = (PREFILTER_TERMS if args.prefilter else []) + args.extra_terms.split(",")
+    query = _prefilter_query(args.q, terms)
+
+    # imports pesados (cliente Google/OAuth) só aqui: `--help` não carrega nada disso
+    from googleapiclient.errors import HttpError
+    from modules.login_gmail import create_login
+
     try:
         _ensure_dir(TOKEN_DIR)
         service = create_login(
@@ -242,7 +378,7 @@ def main():
             scopes=SCOPES,
         )
         label_id = get_or_create_label_id(service, args.label)
-        stats = process_threads(service, args.q, label_id)
+        stats = process_threads(service, query, label_id, args.label)
 
         print("✅ Finalizado.")
         print(f"• Threads analisadas : {stats['threads']}")
@@ -0,0 +1,134 @@
+"""
+Extração em massa via Batch API do Gemini (google-genai): custo ~50% menor e fora do
+limite de RPM interativo. Para execuções offline (ex.: montar a planilha), sem ninguém esperando.
+
+Uso:
+    from modules.gemini_batch import extract_fields_bulk
+    itens_por_email = extract_fields_bulk(registros)   # mesma ordem da entrada
+
+Lotes pequenos (< BATCH_MIN_ROWS) continuam no caminho online (extract_fields_many).
+"""
+
+from __future__ import annotations
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    from .gemini_extractor import (
+        SYSTEM_INSTRUCTIONS, cached_text, extract_fields_many, finish_record,
+        model_name, prepare_record, store_text,
+    )
+    from .json_utils import dumps_json_bytes, parse_json_bytes
+except Exception:
+    from modules.gemini_extractor import (
+        SYSTEM_INSTRUCTIONS, cached_text, extract_fields_many, finish_record,
+        model_name, prepare_record, store_text,
+    )
+    from modules.json_utils import dumps_json_bytes, parse_json_bytes
+
+# Abaixo disso o job em lote não compensa a espera: vai pelo caminho online
+BATCH_MIN_ROWS = int(os.getenv("GEMINI_BATCH_MIN_ROWS", "50"))
+WORK_DIR = os.getenv("GEMINI_BATCH_DIR", os.path.join(".cache", "gemini_batch"))
+
+BATCH_TERMINAL_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+def _make_client():
+    from dotenv import load_dotenv
+    from google import genai
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY não definido no .env")
+    return genai.Client(api_key=api_key)
+
+
+def _response_text_from_json(resp: Dict) -> str:
+    """Texto do 1º candidato de um GenerateContentResponse serializado (linha do JSONL de saída)."""
+    for cand in resp.get("candidates") or []:
+        parts = (cand.get("content") or {}).get("parts") or []
+        text = "".join(p.get("text", "") for p in parts if isinstance(p, dict)).strip()
+        if text:
+            return text
+    return ""
+
+
+def _run_batch_job(prompts: Dict[str, str], work_dir: Path) -> Dict[str, str]:
+    """Envia {key: prompt} como um job da Batch API, aguarda com backoff e devolve {key: texto}."""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    input_path = work_dir / "batch_input.jsonl"
+    system = {"parts": [{"text": SYSTEM_INSTRUCTIONS}]}
+    with input_path.open("wb") as fp:
+        for key, prompt in prompts.items():
+            line = {
+                "key": key,
+                "request": {"contents": [{"role": "user", "parts": [{"text": prompt}]}], "system_instruction": system},
+            }
+            fp.write(dumps_json_bytes(line) + b"\n")
+
+    from google.genai import types
+
+    client = _make_client()
+    uploaded = client.files.upload(
+        file=str(input_path),
+        config=types.UploadFileConfig(display_name="quotes-batch-input", mime_type="jsonl"),
+    )
+    job = client.batches.create(model=model_name(), src=uploaded.name, config={"display_name": "quotes-batch"})
+    print(f"📤 Batch Gemini {job.name} criado com {len(prompts)} requisição(ões); aguardando conclusão...")
+
+    delay = 10.0
+    while job.state.name not in BATCH_TERMINAL_STATES:
+        time.sleep(delay)
+        delay = min(delay * 2, 300.0)
+        job = client.batches.get(name=job.name)
+        print(f"⏳ Batch {job.name}: {job.state.name}")
+
+    if job.state.name != "JOB_STATE_SUCCEEDED" or not getattr(job.dest, "file_name", None):
+        raise RuntimeError(f"Batch {job.name} terminou com estado '{job.state.name}'")
+
+    output = client.files.download(file=job.dest.file_name)
+    (work_dir / "batch_output.jsonl").write_bytes(output)
+
+    texts: Dict[str, str] = {}
+    for raw_line in output.splitlines():
+        if not raw_line.strip():
+            continue
+        rec = parse_json_bytes(raw_line)
+        key = rec.get("key")
+        if key in prompts and not rec.get("error"):
+            texts[key] = _response_text_from_json(rec.get("response") or {})
+    return texts
+
+
+def extract_fields_bulk(email_records: List[Dict], work_dir: Optional[str] = None) -> List[List[Dict[str, str]]]:
+    """
+    extract_fields para muitos e-mails via Batch API (uma lista de itens por registro, na ordem
+    da entrada), com os mesmos prompts, pré-passo de regex e memória de cotações.
+    Respostas já em cache não são reenviadas; as novas entram no cache.
+    Requisição sem resposta (ou job com erro) vira a linha mínima com metadados.
+    """
+    if len(email_records) < BATCH_MIN_ROWS:
+        return extract_fields_many(email_records)
+
+    # mesmo passo por e-mail do caminho online: regex/memória, prompt e chave de cache idênticos
+    prepared = [prepare_record(r) for r in email_records]
+    texts: List[str] = [cached_text(p) if p else "" for _meta, _items, p in prepared]
+
+    pending = {f"{i:06d}": p for i, ((_m, _i, p), t) in enumerate(zip(prepared, texts)) if p and not t}
+    if pending:
+        try:
+            fetched = _run_batch_job(pending, Path(work_dir or WORK_DIR))
+        except Exception as e:
+            print(f"⚠️  Batch Gemini falhou: {e}")
+            fetched = {}
+        for key, text in fetched.items():
+            texts[int(key)] = text
+            store_text(pending[key], text)
+
+    return [
+        items or finish_record(meta, text)
+        for (meta, items, _prompt), text in zip(prepared, texts)
+    ]
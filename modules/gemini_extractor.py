@@ -1,24 +1,35 @@
 import os
 import re
-import json
+import asyncio
+from functools import lru_cache
 from typing import Dict, List, Union
-from dotenv import load_dotenv
-import google.generativeai as genai
+
+try:
+    import langmail  # opcional: limpeza de citações/assinaturas em Rust
+except ImportError:
+    langmail = None
 
 try:
     from .headers import HEADER_FIELDS as TARGET_FIELDS
+    from .llm_cache import cache_enabled, cache_key, cache_get, cache_put
+    from .json_utils import parse_json_bytes
+    from .pt_br_parsers import parse_date_range_pt, extract_tabular_quotes
+    from .quote_memory import memory_enabled, related, keep_new, source_id
+    from .text_clean import strip_forwarding_noise as _strip_forwarding_noise
+    from .io_email import first_value
 except Exception:
     from modules.headers import HEADER_FIELDS as TARGET_FIELDS
+    from modules.llm_cache import cache_enabled, cache_key, cache_get, cache_put
+    from modules.json_utils import parse_json_bytes
+    from modules.pt_br_parsers import parse_date_range_pt, extract_tabular_quotes
+    from modules.quote_memory import memory_enabled, related, keep_new, source_id
+    from modules.text_clean import strip_forwarding_noise as _strip_forwarding_noise
+    from modules.io_email import first_value
 
-load_dotenv()
-_GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
-if not _GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY não definido no .env")
+# Cache em disco das respostas (texto bruto) por (modelo, instruções, prompt); PARROT_LLM_CACHE=0 desliga
+CACHE_DIR = os.getenv("GEMINI_CACHE_DIR", os.path.join(".cache", "gemini"))
 
-genai.configure(api_key=_GEMINI_API_KEY)
-_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash").strip()
-
-_SYSTEM_INSTRUCTIONS = (
+SYSTEM_INSTRUCTIONS = (
     "Você extrai informações de cotações hoteleiras a partir de e-mails. "
     "Retorne ESTRITAMENTE:\n"
     "- Um OBJETO JSON com as chaves exatas, quando houver apenas um tipo de quarto; OU\n"
@@ -28,12 +39,29 @@ _SYSTEM_INSTRUCTIONS = (
     "O campo 'Fornecedor' deve ser o REMETENTE (nome e/ou e-mail de quem enviou)."
 )
 
+_FILL_RULES = """Regras de preenchimento:
+- "Fornecedor": SEMPRE preencher com o REMETENTE (não use destinatário).
+- "Check-in" e "Check-out": usar ISO "AAAA-MM-DD" quando possível. Se houver apenas uma data, usar em "Check-in" e deixar "Check-out" como "".
+- "Número de quartos": apenas dígitos (ex.: "7") referentes àquele item/tipo.
+- "Tipo de quarto": denominação comercial conforme o e-mail (ex.: "Duplo luxo").
+- "Tipo de quarto (normalizado)": versão em minúsculas, removendo termos como "apto/ap./apartamento", "quarto(s)", pontuação redundante e espaços extras (ex.: "duplo luxo").
+- "Preço (num)": SOMENTE o número com ponto e duas casas (ex.: "508.20"); sem "R$", sem milhares.
+- Demais campos: preencher quando existirem; caso contrário, "".
+"""
+
+# Parte fixa primeiro (contexto, campos, formato, regras) e o que muda por e-mail no fim:
+# o prefixo idêntico entre chamadas é o que o cache de prompt do provedor reaproveita
 _USER_TEMPLATE = """Contexto:
 O e-mail abaixo pode conter encaminhamentos e histórico. Foque na(s) mensagem(ns) em que o HOTEL/POUSADA apresenta a COTAÇÃO (preços, políticas etc.). Ignore assinaturas, redes sociais e conversas anteriores sem dados de cotação.
 
 Campos (CHAVES EXATAS; um item por tipo de quarto):
 {campos}
 
+FORMATO DE RESPOSTA:
+- Se houver APENAS UM tipo de quarto, retorne APENAS UM OBJETO JSON.
+- Se houver MÚLTIPLOS tipos de quarto, retorne UM ARRAY JSON; cada item é um OBJETO com as MESMAS chaves.
+
+""" + _FILL_RULES + """
 Metadados:
 - Timestamp: {ts}
 - Assunto: {subject}
@@ -43,27 +71,79 @@ Corpo (limpo):
 ---
 {body}
 ---
+"""
+
+# Partes fixas do prompt, montadas uma vez na importação: lista de campos já renderizada e
+# template quebrado em volta de {ts}/{subject}/{sender}/{body} (por e-mail, só um join)
+_FIELDS_BLOCK = "\n".join(f"- {c}" for c in TARGET_FIELDS)
+_USER_PARTS = tuple(re.split(r"\{(?:ts|subject|sender|body)\}", _USER_TEMPLATE.replace("{campos}", _FIELDS_BLOCK)))
+
+# Vários e-mails num prompt só (extract_fields_batch): cada um com um id estável
+_BATCH_USER_TEMPLATE = """Contexto:
+Abaixo há um ou mais e-mails independentes, cada um identificado por um id (r0, r1, ...). Cada e-mail pode conter encaminhamentos e histórico. Foque na(s) mensagem(ns) em que o HOTEL/POUSADA apresenta a COTAÇÃO (preços, políticas etc.). Ignore assinaturas, redes sociais e conversas anteriores sem dados de cotação.
+
+Campos (CHAVES EXATAS; um item por tipo de quarto):
+{campos}
 
 FORMATO DE RESPOSTA:
-- Se houver APENAS UM tipo de quarto, retorne APENAS UM OBJETO JSON.
-- Se houver MÚLTIPLOS tipos de quarto, retorne UM ARRAY JSON; cada item é um OBJETO com as MESMAS chaves.
+- Retorne UM ÚNICO OBJETO JSON cujas chaves são os ids dos e-mails.
+- O valor de cada id é um ARRAY JSON com um OBJETO por tipo de quarto daquele e-mail (MESMAS chaves acima).
+- Nunca misture dados de e-mails diferentes.
 
-Regras de preenchimento:
-- "Fornecedor": SEMPRE preencher com o REMETENTE (não use destinatário).
-- "Check-in" e "Check-out": usar ISO "AAAA-MM-DD" quando possível. Se houver apenas uma data, usar em "Check-in" e deixar "Check-out" como "".
-- "Número de quartos": apenas dígitos (ex.: "7") referentes àquele item/tipo.
-- "Tipo de quarto": denominação comercial conforme o e-mail (ex.: "Duplo luxo").
-- "Tipo de quarto (normalizado)": versão em minúsculas, removendo termos como "apto/ap./apartamento", "quarto(s)", pontuação redundante e espaços extras (ex.: "duplo luxo").
-- "Preço (num)": SOMENTE o número com ponto e duas casas (ex.: "508.20"); sem "R$", sem milhares.
-- Demais campos: preencher quando existirem; caso contrário, "".
+""" + _FILL_RULES + """
+{n} e-mail(s), ids: {ids}
+
+{emails}
 """
 
+_BATCH_EMAIL_TEMPLATE = """=== E-MAIL {id} ===
+Metadados:
+- Timestamp: {ts}
+- Assunto: {subject}
+- Remetente (quem enviou) → Fornecedor: {sender}
+
+Corpo (limpo):
+---
+{body}
+---"""
+_BATCH_EMAIL_PARTS = tuple(re.split(r"\{(?:id|ts|subject|sender|body)\}", _BATCH_EMAIL_TEMPLATE))
+
+# ----------------- Modelo (import tardio) -----------------
+
+@lru_cache(maxsize=None)
+def _get_model():
+    """
+    Carrega .env, configura o SDK do Gemini e cria o GenerativeModel na primeira chamada;
+    as seguintes reutilizam a mesma instância. Importar este módulo não carrega o SDK.
+    """
+    from dotenv import load_dotenv
+    import google.generativeai as genai
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY não definido no .env")
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name(), system_instruction=SYSTEM_INSTRUCTIONS)
+
+def model_name() -> str:
+    return os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash").strip()
+
 # ----------------- Helpers -----------------
 
+# Regexes compiladas uma vez (chamadas por e-mail/item)
+_JSON_FENCE_RE = re.compile(r"```json\s*([\s\S]*?)\s*```", re.IGNORECASE)
+_HOTEL_WORD_RE = re.compile(r"\b(hotel|pousada|resort)\b", re.I)
+_NOT_CITY_RE = re.compile(r"\b(hotel|pousada|resort|parrot trips|reveillon|cotação|cota[oõ])\b", re.I)
+_APTO_RE = re.compile(r"\b(apto|apartamento|ap\.?)\b")
+_LABEL_PUNCT_RE = re.compile(r"[:\-–—]")
+_WS_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+
 def _extract_json_block(text: str) -> str:
     """Extrai o bloco JSON (objeto ou array) de uma resposta possivelmente com rodeios/markdown."""
     t = (text or "").strip()
-    m = re.search(r"```json\s*([\s\S]*?)\s*```", t, flags=re.IGNORECASE)
+    m = _JSON_FENCE_RE.search(t)
     if m:
         return m.group(1).strip()
 
@@ -79,8 +159,16 @@ def _extract_json_block(text: str) -> str:
 
 def _force_json_to_list(text: str) -> List[Dict[str, str]]:
     """Converte a resposta em lista de objetos (se vier objeto único, embrulha em lista)."""
-    block = _extract_json_block(text)
-    data = json.loads(block)
+    t = (text or "").strip()
+    data = None
+    # caso comum: a resposta já é só o JSON; parseia direto, sem regex nem varreduras de delimitadores
+    if t and t[0] in "{[" and t[-1] in "}]":
+        try:
+            data = parse_json_bytes(t)
+        except ValueError:
+            data = None
+    if data is None:
+        data = parse_json_bytes(_extract_json_block(t))
     if isinstance(data, dict):
         return [data]
     if isinstance(data, list):
@@ -91,57 +179,66 @@ def _force_json_to_list(text: str) -> List[Dict[str, str]]:
         return items
     return []
 
-def _strip_forwarding_noise(s: str) -> str:
-    if not isinstance(s, str):
-        return ""
-    t = s.replace("\r\n", "\n").replace("\r", "\n")
-    # blocos de encaminhamento
-    t = re.sub(r"(?m)^[- ]{5,} Forwarded message [- ]{5,}\n.*?(?=\n\n|\Z)", "", t, flags=re.IGNORECASE|re.DOTALL)
-    # cabeçalhos repetidos
-    t = re.sub(r"(?m)^(From|De|To|Para|Subject|Assunto|Date|Data):.*$", "", t)
-    # urls/assinaturas
-    t = re.sub(r"https?://\S+", "", t)
-    t = re.sub(r"(?mi)^--\s*$.*?(?=\n\S|\Z)", "", t, flags=re.DOTALL)
-    # heurística: se encontrar âncoras típicas de cotação, corta a partir dali
-    anchor = re.search(r"(?i)(valores sobre nossas diárias|acomodações disponíveis|diária inclui|nossos valores)", t)
-    if anchor:
-        t = t[anchor.start():]
-    t = re.sub(r"[ \t]+", " ", t)
-    t = re.sub(r"\n{3,}", "\n\n", t).strip()
-    return t
+def _force_json_to_id_map(text: str) -> Dict[str, List[Dict[str, str]]]:
+    """Resposta em lote {"r0": [...], "r1": {...}} -> {id: lista de objetos}."""
+    t = (text or "").strip()
+    m = _JSON_FENCE_RE.search(t)
+    if m:
+        t = m.group(1).strip()
+    o0, o1 = t.find("{"), t.rfind("}")
+    if o0 != -1 and o1 != -1 and o1 > o0:
+        t = t[o0:o1+1]
+    data = parse_json_bytes(t)
+    if not isinstance(data, dict):
+        return {}
+    out: Dict[str, List[Dict[str, str]]] = {}
+    for rid, val in data.items():
+        if isinstance(val, dict):
+            out[str(rid)] = [val]
+        elif isinstance(val, list):
+            out[str(rid)] = [it for it in val if isinstance(it, dict)]
+    return out
 
 def _guess_hotel_city_from_subject(subject: str) -> tuple[str, str]:
     hotel, city = "", ""
     parts = [p.strip() for p in (subject or "").split("|")]
-    for p in parts:
-        if re.search(r"(?i)\b(hotel|pousada|resort)\b", p):
+    # vale a última parte com "hotel/pousada/resort": de trás para frente, para na primeira
+    for p in reversed(parts):
+        if _HOTEL_WORD_RE.search(p):
             hotel = p
+            break
     for p in parts:
-        if p and not re.search(r"(?i)\b(hotel|pousada|resort|parrot trips|reveillon|cotação|cota[oõ])\b", p):
+        if p and not _NOT_CITY_RE.search(p):
             city = p
             break
     return hotel, city
 
+# Linha vazia no esquema, montada uma vez; cada item parte de uma cópia
+_EMPTY_ROW: Dict[str, str] = {k: "" for k in TARGET_FIELDS}
+_TARGET_SET = frozenset(TARGET_FIELDS)
+
 def _ensure_all_fields_dict() -> Dict[str, str]:
-    return {k: "" for k in TARGET_FIELDS}
+    return _EMPTY_ROW.copy()
 
 def _normalize_label(label: str) -> str:
     if not label:
         return ""
     s = str(label).lower()
-    s = re.sub(r"\b(apto|apartamento|ap\.?)\b", "", s)
+    s = _APTO_RE.sub("", s)
     s = s.replace("quarto", "").replace("quartos", "")
     s = s.replace(" - ", " ")
-    s = re.sub(r"[:\-–—]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _LABEL_PUNCT_RE.sub(" ", s)
+    s = _WS_RE.sub(" ", s).strip()
     return s
 
 def _only_digits_str(s) -> str:
     if s is None:
         return ""
-    m = re.search(r"\d+", str(s))
+    m = _DIGITS_RE.search(str(s))
     return m.group(0) if m else ""
 
+_NON_PRICE_CHARS_RE = re.compile(r"[^\d\.,]")
+
 def _parse_brl_price_to_float_string(val) -> str:
     """Aceita 'R$ 1.234,56' ou '1234.56' e devolve string '1234.56' (2 casas)."""
     if val is None:
@@ -149,7 +246,7 @@ def _parse_brl_price_to_float_string(val) -> str:
     s = str(val).strip()
     if s == "":
         return ""
-    s = re.sub(r"[^\d\.,]", "", s)
+    s = _NON_PRICE_CHARS_RE.sub("", s)
     if s == "":
         return ""
     if "," in s:
@@ -165,9 +262,10 @@ def _parse_brl_price_to_float_string(val) -> str:
 def _post_coerce_item(item: Dict[str, str], meta_ts: str, meta_sender: str, meta_subject: str) -> Dict[str, str]:
     """Pós-processamento para garantir aderência ao esquema canônico."""
     coerced = _ensure_all_fields_dict()
-    for k in TARGET_FIELDS:
-        if k in item and item[k] is not None:
-            coerced[k] = str(item[k])
+    # percorre só as chaves que o LLM devolveu; chaves fora do esquema são ignoradas
+    for k, v in item.items():
+        if v is not None and k in _TARGET_SET:
+            coerced[k] = str(v)
 
     if not coerced["Timestamp"]:
         coerced["Timestamp"] = meta_ts or ""
@@ -193,66 +291,364 @@ def _post_coerce_item(item: Dict[str, str], meta_ts: str, meta_sender: str, meta
     return coerced
 
 
-def extract_fields(email_record: Dict) -> List[Dict[str, str]]:
+def _record_meta(email_record: Dict) -> tuple[str, str, str, str]:
+    """(timestamp, assunto, remetente, corpo limpo) do registro de e-mail."""
+    ts = str(first_value(email_record, "timestamp"))
+    subject = first_value(email_record, "subject")
+    sender = first_value(email_record, "from")
+    raw_body = first_value(email_record, "body")
+    return ts, subject, sender, _clean_body(raw_body)
+
+# Teto do corpo limpo pelo langmail (corte determinístico: menos tokens no prompt)
+LANGMAIL_MAX_BODY = int(os.getenv("LANGMAIL_MAX_BODY", "4000"))
+
+def _clean_body(raw_body: str) -> str:
+    """Corpo sem citações/assinaturas/encaminhamentos: langmail quando instalado, senão o limpador local."""
+    if langmail is not None and isinstance(raw_body, str) and raw_body:
+        try:
+            result = langmail.preprocess_with_options(
+                raw_body, strip_quotes=True, strip_signature=True, max_body_length=LANGMAIL_MAX_BODY
+            )
+            body = (getattr(result, "body", "") or "").strip()
+            if body:
+                return body
+        except Exception:
+            pass
+    return _strip_forwarding_noise(raw_body)
+
+def _build_user_prompt(ts: str, subject: str, sender: str, body: str, hints: str = "") -> str:
+    p0, p1, p2, p3, p4 = _USER_PARTS
+    prompt = "".join((p0, ts, p1, subject, p2, sender, p3, body, p4))
+    if hints:
+        prompt += "\n" + hints + "\n"
+    return prompt
+
+# Atalho sem LLM quando os parsers de regex acham período + tabela de preços (PT_BR_FASTPATH=1 liga).
+# Desligado por padrão: o parser de tabela não separa bem categoria da linha de preço.
+REGEX_FASTPATH = os.getenv("PT_BR_FASTPATH", "0").strip() == "1"
+
+def _regex_prepass(ts: str, subject: str, sender: str, body: str) -> tuple[List[Dict[str, str]], str]:
     """
-    Extrai itens normalizados (um por tipo de quarto).
-    Retorna lista de dicionários nas chaves TARGET_FIELDS.
+    Roda os parsers determinísticos (pt_br_parsers) no corpo limpo.
+    Completo (período + ao menos uma linha de preço): devolve os itens prontos, sem LLM.
+    Parcial: devolve só as pistas em texto, para ir no prompt.
     """
-    # Metadados mínimos
-    ts = str(email_record.get("timestamp", "")) or str(email_record.get("date", "")) or ""
-    subject = email_record.get("subject", "") or email_record.get("assunto", "") or ""
-    sender = email_record.get("from", "") or email_record.get("remetente", "") or ""
-    raw_body = email_record.get("body", "") or email_record.get("texto", "") or email_record.get("content", "") or ""
-    body = _strip_forwarding_noise(raw_body)
+    try:
+        checkin, checkout = parse_date_range_pt(body)
+    except Exception:
+        checkin, checkout = None, None
+    try:
+        rows = extract_tabular_quotes(body)
+    except Exception:
+        rows = []
 
-    # LLM
-    model = genai.GenerativeModel(_MODEL_NAME, system_instruction=_SYSTEM_INSTRUCTIONS)
-    user_prompt = _USER_TEMPLATE.format(
-        campos="\n".join(f"- {c}" for c in TARGET_FIELDS),
-        ts=ts, subject=subject, sender=sender, body=body
-    )
+    if REGEX_FASTPATH and checkin and rows:
+        items = []
+        for row in rows:
+            item = {
+                "Check-in": checkin,
+                "Check-out": checkout or "",
+                "Categoria do quarto": row.get("Tipo de quarto", ""),
+                "Preço (num)": row.get("Preço (num)", ""),
+                "Taxa? Ex.: 5% de ISS": row.get("Taxa? Ex.: 5% de ISS", ""),
+            }
+            items.append(_post_coerce_item(item, ts, sender, subject))
+        return items, ""
+
+    hints = ["Pistas já extraídas automaticamente do corpo (confirme antes de usar):"]
+    if checkin:
+        hints.append(f"- Check-in: {checkin} / Check-out: {checkout or ''}")
+    for row in rows:
+        hints.append(f"- {row.get('Tipo de quarto', '')}: {row.get('Preço (num)', '')} {row.get('Taxa? Ex.: 5% de ISS', '')}".rstrip())
+    return [], "\n".join(hints) if len(hints) > 1 else ""
+
+def _memory_hints(subject: str, sender: str) -> str:
+    """Cotações já extraídas do mesmo fornecedor/hotel (QUOTE_MEMORY=1), para o modelo não repetir."""
+    if not memory_enabled():
+        return ""
+    hotel, _ = _guess_hotel_city_from_subject(subject)
+    prior = related(sender, hotel)
+    if not prior:
+        return ""
+    return "Cotações já extraídas de e-mails anteriores deste fornecedor (NÃO repita as que forem só re-citadas):\n" + prior
+
+def _prompt_hints(regex_hints: str, subject: str, sender: str) -> str:
+    return "\n\n".join(h for h in (regex_hints, _memory_hints(subject, sender)) if h)
 
+def _drop_seen(items: List[Dict[str, str]], ts: str, sender: str, subject: str) -> List[Dict[str, str]]:
+    """Com a memória ligada, tira itens que outro e-mail já produziu e registra os novos."""
+    if not items or not memory_enabled():
+        return items
+    return keep_new(items, source_id(ts, sender, subject), sender)
+
+def _response_text(resp) -> str:
+    """Extrai o texto de forma robusta (resp.text ou candidates/parts)."""
+    text = (getattr(resp, "text", None) or "").strip()
+    if not text:
+        try:
+            for cand in getattr(resp, "candidates", []) or []:
+                content = getattr(cand, "content", None)
+                parts = getattr(content, "parts", []) if content else []
+                for p in parts:
+                    ptxt = getattr(p, "text", None)
+                    if ptxt and ptxt.strip():
+                        text = ptxt.strip()
+                        break
+                if text:
+                    break
+        except Exception:
+            pass
+    return text
+
+def _meta_only_item(ts: str, sender: str, subject: str) -> Dict[str, str]:
+    row = _ensure_all_fields_dict()
+    row["Timestamp"] = ts
+    row["Fornecedor"] = sender
+    row["Assunto"] = subject
+    return row
+
+def cached_text(user_prompt: str) -> str:
+    """Texto já salvo para este prompt ("" se não houver ou cache desligado)."""
+    if not cache_enabled():
+        return ""
+    cached = cache_get(CACHE_DIR, cache_key(model_name(), SYSTEM_INSTRUCTIONS, user_prompt))
+    return cached if isinstance(cached, str) else ""
+
+def store_text(user_prompt: str, text: str) -> None:
+    # respostas vazias não entram: são tentadas de novo na próxima execução
+    if text and cache_enabled():
+        cache_put(CACHE_DIR, cache_key(model_name(), SYSTEM_INSTRUCTIONS, user_prompt), text)
+
+def _generate_text(model, user_prompt: str) -> str:
+    """generate_content com cache em disco: prompt repetido não vai à rede."""
+    text = cached_text(user_prompt)
+    if not text:
+        text = _response_text(model.generate_content(user_prompt))
+        store_text(user_prompt, text)
+    return text
+
+def _items_from_text(text: str, ts: str, sender: str, subject: str) -> List[Dict[str, str]]:
+    """Texto do LLM -> itens coeridos ao esquema (lista vazia se não veio JSON)."""
     items: List[Dict[str, str]] = []
+    if text:
+        # pós-coerção/garantia de esquema
+        for it in _force_json_to_list(text):
+            items.append(_post_coerce_item(it, ts, sender, subject))
+    return items
+
+
+def _record_hints(email_record: Dict) -> tuple[tuple[str, str, str, str], List[Dict[str, str]], str]:
+    """
+    (metadados, itens do regex, pistas) de um e-mail. Se o regex já resolve (PT_BR_FASTPATH=1),
+    os itens vêm prontos (já sem os vistos pela memória) e não há pistas; senão, itens vazios
+    e as pistas (regex + QUOTE_MEMORY) que vão no prompt.
+    """
+    meta = _record_meta(email_record)
+    ts, subject, sender, body = meta
+    regex_items, hints = _regex_prepass(ts, subject, sender, body)
+    if regex_items:
+        return meta, _finish_items(meta, regex_items), ""
+    return meta, [], _prompt_hints(hints, subject, sender)
+
+def prepare_record(email_record: Dict) -> tuple[tuple[str, str, str, str], List[Dict[str, str]], str]:
+    """
+    Passo por e-mail comum a todos os caminhos (extract_fields, extract_fields_many, Batch API):
+    (metadados, itens, prompt). Com itens, o e-mail já está resolvido e o prompt é "";
+    senão, o prompt é o final (com as pistas) a mandar ao LLM.
+    """
+    meta, items, hints = _record_hints(email_record)
+    return meta, items, ("" if items else _build_user_prompt(*meta, hints))
+
+def _finish_items(meta: tuple[str, str, str, str], items: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Itens já coeridos -> sem os que a memória já viu; linha mínima com metadados se nada sobrar."""
+    ts, subject, sender, _body = meta
     try:
-        resp = model.generate_content(user_prompt)
+        items = _drop_seen(items, ts, sender, subject)
+    except Exception:
+        pass
+    return items or [_meta_only_item(ts, sender, subject)]
+
+def finish_record(meta: tuple[str, str, str, str], text: str) -> List[Dict[str, str]]:
+    """Passo final comum: texto do LLM ("" se falhou) -> itens do e-mail."""
+    ts, subject, sender, _body = meta
+    try:
+        items = _items_from_text(text, ts, sender, subject)
+    except Exception:
+        items = []
+    return _finish_items(meta, items)
 
-        # extrai texto de forma robusta (resp.text ou candidates/parts)
-        text = (getattr(resp, "text", None) or "").strip()
-        if not text:
-            try:
-                for cand in getattr(resp, "candidates", []) or []:
-                    content = getattr(cand, "content", None)
-                    parts = getattr(content, "parts", []) if content else []
-                    for p in parts:
-                        ptxt = getattr(p, "text", None)
-                        if ptxt and ptxt.strip():
-                            text = ptxt.strip()
-                            break
-                    if text:
-                        break
-            except Exception:
-                pass
 
-        if text:
-            parsed_list = _force_json_to_list(text)
-            # pós-coerção/garantia de esquema
-            for it in parsed_list:
-                items.append(_post_coerce_item(it, ts, sender, subject))
+def extract_fields(email_record: Dict) -> List[Dict[str, str]]:
+    """
+    Extrai itens normalizados (um por tipo de quarto).
+    Retorna lista de dicionários nas chaves TARGET_FIELDS.
+    """
+    # Regex primeiro: se já resolve o e-mail, nem chama o LLM
+    meta, items, user_prompt = prepare_record(email_record)
+    if items:
+        return items
 
+    # LLM
+    model = _get_model()
+    try:
+        text = _generate_text(model, user_prompt)
     except Exception:
         # se der erro no LLM, ainda retornamos um item mínimo com metadados
-        fail_min = _ensure_all_fields_dict()
-        fail_min["Timestamp"] = ts
-        fail_min["Fornecedor"] = sender
-        fail_min["Assunto"] = subject
-        items.append(fail_min)
+        text = ""
 
     # se o LLM retornou nada válido, devolve ao menos uma linha com metadados
-    if not items:
-        min_row = _ensure_all_fields_dict()
-        min_row["Timestamp"] = ts
-        min_row["Fornecedor"] = sender
-        min_row["Assunto"] = subject
-        items = [min_row]
+    return finish_record(meta, text)
 
-    return items
+
+def _is_rate_limited(exc: Exception) -> bool:
+    """429 do Gemini (google.api_core ResourceExhausted via gRPC, ou HTTP 429)."""
+    return getattr(exc, "code", None) == 429 or type(exc).__name__ == "ResourceExhausted"
+
+# Falhas transitórias (timeout/5xx): tenta de novo com backoff, sem reduzir a concorrência
+_TRANSIENT_ERRORS = {"DeadlineExceeded", "ServiceUnavailable", "InternalServerError"}
+
+def _is_transient(exc: Exception) -> bool:
+    return getattr(exc, "code", None) in (500, 503, 504) or type(exc).__name__ in _TRANSIENT_ERRORS
+
+class _AdaptiveLimiter:
+    """
+    Limite de chamadas simultâneas com AIMD: cai pela metade a cada 429 e sobe 1 a cada
+    `grow_every` sucessos, entre 1 e `max_limit`. `metrics` expõe o estado atual.
+    """
+
+    def __init__(self, start: int, max_limit: int, grow_every: int = 10):
+        self.limit = max(1, min(start, max_limit))
+        self.max_limit = max(1, max_limit)
+        self.grow_every = grow_every
+        self._in_flight = 0
+        self._streak = 0
+        self._cond = asyncio.Condition()
+        self.metrics: Dict[str, int] = {"concurrency": self.limit, "throttled": 0, "ok": 0}
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        self.metrics["ok"] += 1
+        self._streak += 1
+        if self._streak >= self.grow_every and self.limit < self.max_limit:
+            self.limit += 1
+            self._streak = 0
+        self.metrics["concurrency"] = self.limit
+
+    def on_throttle(self) -> None:
+        self.metrics["throttled"] += 1
+        self._streak = 0
+        self.limit = max(1, self.limit // 2)
+        self.metrics["concurrency"] = self.limit
+
+# Estado do limitador da última execução de extract_fields_many (concorrência, 429s, sucessos)
+metrics: Dict[str, int] = {}
+
+async def _generate_async(model, user_prompt: str, limiter: _AdaptiveLimiter, max_retries: int = 5):
+    """
+    generate_content_async sob o limitador; em 429 reduz a concorrência e tenta de novo com backoff,
+    em timeout/5xx só tenta de novo.
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            async with limiter:
+                resp = await model.generate_content_async(user_prompt)
+            limiter.on_success()
+            return resp
+        except Exception as e:
+            throttled = _is_rate_limited(e)
+            if not (throttled or _is_transient(e)) or attempt == max_retries:
+                raise
+            if throttled:
+                limiter.on_throttle()
+            await asyncio.sleep(min(60.0, 2.0 ** attempt))
+
+async def _extract_fields_async(model, email_record: Dict, limiter: _AdaptiveLimiter) -> List[Dict[str, str]]:
+    """Mesmo contrato de extract_fields; só a chamada de rede é aguardada (sob o limitador)."""
+    meta, items, user_prompt = prepare_record(email_record)
+    if items:
+        return items
+    try:
+        text = cached_text(user_prompt)
+        if not text:
+            text = _response_text(await _generate_async(model, user_prompt, limiter))
+            store_text(user_prompt, text)
+    except Exception:
+        text = ""
+    return finish_record(meta, text)
+
+def extract_fields_many(
+    email_records: List[Dict], concurrency: int = 32, max_concurrency: int = 128
+) -> List[List[Dict[str, str]]]:
+    """
+    extract_fields para vários e-mails em paralelo no Gemini. Começa com `concurrency`
+    chamadas simultâneas e se ajusta sozinho (AIMD) conforme os 429, até `max_concurrency`.
+    Retorna uma lista de itens por registro, na mesma ordem da entrada.
+    """
+    model = _get_model()
+
+    async def _run() -> List[List[Dict[str, str]]]:
+        limiter = _AdaptiveLimiter(concurrency, max(concurrency, max_concurrency))
+        try:
+            return await asyncio.gather(*(_extract_fields_async(model, r, limiter) for r in email_records))
+        finally:
+            metrics.clear()
+            metrics.update(limiter.metrics)
+
+    return list(asyncio.run(_run())) if email_records else []
+
+
+def _batch_email(rid: str, meta: tuple[str, str, str, str], hints: str) -> str:
+    """Bloco de um e-mail no prompt em lote (pistas do regex/memória logo após o corpo)."""
+    e0, e1, e2, e3, e4, e5 = _BATCH_EMAIL_PARTS
+    ts, subject, sender, body = meta
+    block = "".join((e0, rid, e1, ts, e2, subject, e3, sender, e4, body, e5))
+    return block + "\n" + hints if hints else block
+
+def extract_fields_batch(email_records: List[Dict], batch: int = 8) -> List[List[Dict[str, str]]]:
+    """
+    Como extract_fields, mas com até `batch` e-mails por chamada ao Gemini (um prompt com ids r0, r1, ...).
+    O pré-passo de regex (PT_BR_FASTPATH) e a memória (QUOTE_MEMORY) valem por e-mail, como no
+    caminho unitário: e-mail resolvido pelo regex nem entra no prompt.
+    Retorna uma lista de itens por registro, na mesma ordem da entrada; e-mail sem resposta
+    (ou lote com erro) recebe a linha mínima com metadados.
+    """
+    model = _get_model()
+    batch = max(1, batch)
+    results: List[List[Dict[str, str]]] = []
+
+    for start in range(0, len(email_records), batch):
+        prepared = [_record_hints(r) for r in email_records[start:start + batch]]
+        ids = [f"r{i}" for i in range(len(prepared))]
+        todo = [(rid, meta, hints) for rid, (meta, items, hints) in zip(ids, prepared) if not items]
+
+        by_id: Dict[str, List[Dict]] = {}
+        if todo:
+            emails = "\n\n".join(_batch_email(rid, meta, hints) for rid, meta, hints in todo)
+            user_prompt = _BATCH_USER_TEMPLATE.format(
+                n=len(todo), campos=_FIELDS_BLOCK, emails=emails, ids=", ".join(rid for rid, _m, _h in todo)
+            )
+            try:
+                by_id = _force_json_to_id_map(_generate_text(model, user_prompt))
+            except Exception:
+                by_id = {}
+
+        for rid, (meta, items, _hints) in zip(ids, prepared):
+            if not items:
+                ts, subject, sender, _body = meta
+                try:
+                    items = [_post_coerce_item(it, ts, sender, subject) for it in by_id.get(rid, [])]
+                except Exception:
+                    items = []
+                items = _finish_items(meta, items)
+            results.append(items)
+
+    return results
@@ -1,5 +1,7 @@
 from __future__ import annotations
-from typing import List, Dict, Optional, Any
+import random
+import time
+from typing import List, Dict, Iterator, Optional, Any, Tuple
 from datetime import datetime
 from dateutil import tz
 
@@ -36,6 +38,7 @@ def list_messages(
             q=query or None,
             pageToken=page_token,
             maxResults=min(max_results - fetched, 500) if max_results else 500,
+            fields=LIST_FIELDS,
         )
         resp = req.execute()
         msgs_batch = resp.get("messages", [])
@@ -46,8 +49,74 @@ def list_messages(
             break
     return msgs
 
+# Respostas parciais: só os campos que o código lê (sem labelIds, snippet, sizeEstimate, anexos etc.)
+LIST_FIELDS = "nextPageToken,messages(id,threadId)"
+THREAD_FIELDS = (
+    "messages(id,internalDate,"
+    "payload(headers(name,value),mimeType,body/data,parts(mimeType,body/data,parts)))"
+)
+
+# Gmail aceita até 100 chamadas por batch, mas recomenda <= 50 (acima disso o rate limit aperta)
+BATCH_SIZE = 50
+
 def get_thread(service: Resource, thread_id: str) -> Dict[str, Any]:
-    return service.users().threads().get(userId="me", id=thread_id, format="full").execute()
+    return service.users().threads().get(
+        userId="me", id=thread_id, format="full", fields=THREAD_FIELDS
+    ).execute()
+
+# Erros por item do batch que valem nova tentativa (rate limit e falhas transitórias do servidor)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+def _http_status(exc: Optional[BaseException]) -> Optional[int]:
+    return getattr(getattr(exc, "resp", None), "status", None)
+
+def get_threads_batch(
+    service: Resource, thread_ids: List[str], batch_size: int = BATCH_SIZE, max_retries: int = 5
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Busca as threads em requisições batch (até `batch_size` threads.get por chamada HTTP).
+    Itens que voltam com 429/5xx (ou sem resposta) são reenviados em novo batch, com backoff
+    exponencial (jitter, teto 30s), até `max_retries` tentativas; só então saem com o erro.
+    Produz (thread_id, thread, erro) na ordem de thread_ids; só um lote fica em memória.
+    """
+    for i in range(0, len(thread_ids), batch_size):
+        chunk = thread_ids[i:i + batch_size]
+        results: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[Exception]]] = {}
+
+        def _collect(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        pending = chunk
+        for attempt in range(1, max_retries + 1):
+            batch = service.new_batch_http_request(callback=_collect)
+            for tid in pending:
+                batch.add(
+                    service.users().threads().get(userId="me", id=tid, format="full", fields=THREAD_FIELDS),
+                    request_id=tid,
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                # o batch inteiro falhou: todos os pendentes ficam com o erro
+                if _http_status(e) not in RETRYABLE_STATUS:
+                    raise
+                for tid in pending:
+                    results[tid] = (None, e)
+
+            pending = [
+                tid for tid in pending
+                if tid not in results
+                or (results[tid][1] is not None and _http_status(results[tid][1]) in RETRYABLE_STATUS)
+            ]
+            if not pending or attempt == max_retries:
+                break
+            delay = random.uniform(0, min(30.0, 2.0 ** attempt))
+            print(f"⚠️  {len(pending)} thread(s) com 429/5xx (tentativa {attempt}/{max_retries}). Retentando em {delay:.1f}s...")
+            time.sleep(delay)
+
+        for tid in chunk:
+            thread, exc = results.get(tid, (None, RuntimeError("sem resposta no batch")))
+            yield tid, thread, exc
 
 def _iso_from_internal_date(internal_ms: str) -> str:
     """Converte internalDate (ms since epoch) em ISO local São Paulo."""
@@ -1,12 +1,44 @@
 import os
-import json
 from datetime import datetime
+from functools import lru_cache
+
+try:
+    from .json_utils import load_json_file
+except Exception:
+    from modules.json_utils import load_json_file
+
+# Nomes possíveis de cada campo nos JSONs de e-mail, em ordem de preferência
+EMAIL_FIELD_ALIASES = {
+    "timestamp": ("timestamp", "date"),
+    "subject":   ("subject", "assunto"),
+    "to":        ("recipient", "to", "destinatario"),
+    "from":      ("sender", "from", "remetente"),
+    "body":      ("body", "text", "texto", "content"),
+}
+
+def first_value(d: dict, field: str):
+    """1º valor não vazio entre os nomes de `field` em EMAIL_FIELD_ALIASES ("" se nenhum)."""
+    for k in EMAIL_FIELD_ALIASES[field]:
+        v = d.get(k)
+        if v:
+            return v
+    return ""
 
 def infer_timestamp_from_filename(filename: str) -> str:
     """Ex.: 20250808_1241__*.json -> '2025-08-08 12:41'"""
-    base = os.path.basename(filename)
+    return _timestamp_from_basename(os.path.basename(filename))
+
+@lru_cache(maxsize=4096)
+def _timestamp_from_basename(base: str) -> str:
+    prefix = base.split("__", 1)[0]  # 20250808_1241
+    # formato fixo: fatia e valida com datetime(), sem o strptime (bem mais lento)
+    if len(prefix) == 13 and prefix.isascii() and prefix[8] == "_" and prefix[:8].isdigit() and prefix[9:].isdigit():
+        try:
+            datetime(int(prefix[:4]), int(prefix[4:6]), int(prefix[6:8]), int(prefix[9:11]), int(prefix[11:]))
+        except ValueError:
+            return ""
+        return f"{prefix[:4]}-{prefix[4:6]}-{prefix[6:8]} {prefix[9:11]}:{prefix[11:]}"
     try:
-        prefix = base.split("__", 1)[0]  # 20250808_1241
         dt = datetime.strptime(prefix, "%Y%m%d_%H%M")
         return dt.strftime("%Y-%m-%d %H:%M")
     except Exception:
@@ -22,22 +54,15 @@ def load_email_json(path: str) -> dict:
       - JSON "flat"
     Retorna: {timestamp, subject, to, from, body, _filename}
     """
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = load_json_file(path)
 
     if isinstance(data, dict) and isinstance(data.get("emails"), list) and data["emails"]:
         msg = data["emails"][0] or {}
-        timestamp = (msg.get("timestamp") or data.get("timestamp") or infer_timestamp_from_filename(path) or "")
-        subject   = msg.get("subject") or data.get("subject") or ""
-        to_       = msg.get("recipient") or msg.get("to") or data.get("to") or ""
-        sender    = msg.get("sender") or msg.get("from") or data.get("from") or ""
-        body      = msg.get("body") or msg.get("text") or data.get("body") or ""
     else:
-        timestamp = data.get("timestamp") or data.get("date") or infer_timestamp_from_filename(path) or ""
-        subject   = data.get("subject") or ""
-        to_       = data.get("recipient") or data.get("to") or ""
-        sender    = data.get("sender") or data.get("from") or ""
-        body      = data.get("body") or data.get("text") or data.get("content") or ""
+        msg = {}
+    fields = {f: first_value(msg, f) or first_value(data, f) for f in EMAIL_FIELD_ALIASES}
+    timestamp = fields["timestamp"] or infer_timestamp_from_filename(path) or ""
+    subject, to_, sender, body = fields["subject"], fields["to"], fields["from"], fields["body"]
 
     return {
         "timestamp": timestamp,
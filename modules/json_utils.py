@@ -1,20 +1,47 @@
 import os
-import re
 import json
+from typing import Any, Union
+
+try:
+    import orjson  # opcional: parser/serializador em C, bem mais rápido que json da stdlib
+except ImportError:
+    orjson = None
+
+_DECODER = json.JSONDecoder()
 
 def force_json_object(text: str) -> dict:
     """Aceita resposta com ```json ... ``` ou texto solto; devolve o 1º objeto JSON válido."""
     text = (text or "").strip()
-    m = re.search(r"```json\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
-    if m:
-        text = m.group(1).strip()
-    b0, b1 = text.find("{"), text.rfind("}")
-    if b0 != -1 and b1 != -1 and b1 > b0:
-        text = text[b0:b1+1]
-    return json.loads(text)
+    fence = text.find("```json")
+    if fence != -1:
+        text = text[fence + 7:]
+    # raw_decode lê um único objeto a partir do 1º "{" e ignora o que vier depois (fecho da cerca, texto)
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("nenhum objeto JSON na resposta")
+    obj, _end = _DECODER.raw_decode(text, start)
+    return obj
 
 def blank_row(fields: list[str]) -> dict:
     return {k: "" for k in fields}
 
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
+
+def parse_json_bytes(data: Union[bytes, str]) -> Any:
+    """Parseia JSON em bytes (ou str) com orjson quando instalado; senão json da stdlib."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def load_json_file(path: str) -> Any:
+    """Lê e parseia um arquivo JSON (usa orjson quando instalado)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return parse_json_bytes(data)
+
+def dumps_json_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Serializa para bytes UTF-8 sem escapar acentos (usa orjson quando instalado)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
@@ -0,0 +1,61 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+try:
+    from .json_utils import load_json_file
+except Exception:
+    from modules.json_utils import load_json_file
+
+# Camada em memória na frente do disco: repetições na mesma execução não leem arquivo
+MEMORY_MAX_ITEMS = int(os.getenv("PARROT_LLM_CACHE_MEM", "4096"))
+_MEMORY: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+_MEMORY_LOCK = threading.Lock()
+
+def _remember(cache_dir: str, key: str, value: Any) -> None:
+    if MEMORY_MAX_ITEMS <= 0:
+        return
+    with _MEMORY_LOCK:
+        _MEMORY[(cache_dir, key)] = value
+        _MEMORY.move_to_end((cache_dir, key))
+        while len(_MEMORY) > MEMORY_MAX_ITEMS:
+            _MEMORY.popitem(last=False)
+
+def cache_enabled() -> bool:
+    """Cache de respostas do LLM ligado por padrão; PARROT_LLM_CACHE=0 desliga."""
+    return os.getenv("PARROT_LLM_CACHE", "1").strip() != "0"
+
+def cache_key(*parts: str) -> str:
+    """SHA-256 das partes (ex.: modelo, instruções de sistema, prompt) separadas por NUL."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+def cache_get(cache_dir: str, key: str) -> Optional[Any]:
+    """Retorna o valor salvo para `key` ou None (ausente/ilegível)."""
+    with _MEMORY_LOCK:
+        if (cache_dir, key) in _MEMORY:
+            _MEMORY.move_to_end((cache_dir, key))
+            return _MEMORY[(cache_dir, key)]
+    path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        value = load_json_file(path)
+    except Exception:
+        return None
+    _remember(cache_dir, key, value)
+    return value
+
+def cache_put(cache_dir: str, key: str, value: Any) -> None:
+    """Grava de forma atômica (arquivo temporário + os.replace); falhas de escrita são ignoradas."""
+    _remember(cache_dir, key, value)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{key}.json"))
+    except Exception:
+        pass
@@ -1,7 +1,6 @@
 # modules/login_gmail.py
 from __future__ import annotations
 import os
-import json
 from pathlib import Path
 from typing import Sequence, Optional
 
@@ -10,15 +9,24 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
 from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
+
+try:
+    from .json_utils import load_json_file
+except Exception:
+    from modules.json_utils import load_json_file
 
 # Dar permissão de leitura+escrita (rotular, arquivar etc.)
 DEFAULT_SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 
+# Timeout (s) de cada chamada HTTP à API do Gmail
+HTTP_TIMEOUT = 60
+
 def _granted_scopes_from_file(token_path: str) -> set[str]:
     """Lê o token e retorna o set de escopos realmente concedidos."""
     try:
-        with open(token_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = load_json_file(token_path)
         scopes = data.get("scopes", [])
         if isinstance(scopes, str):
             scopes = [s.strip() for s in scopes.split()]
@@ -48,8 +56,7 @@ def create_login(
         if not set(scopes).issubset(granted):
             need_reconsent = True
         # Carrega as credenciais a partir do arquivo
-        with open(token_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = load_json_file(token_path)
         creds = Credentials.from_authorized_user_info(data, scopes=scopes)
 
     if not need_reconsent:
@@ -73,5 +80,8 @@ def create_login(
         with open(token_path, "w", encoding="utf-8") as token:
             token.write(creds.to_json())
 
-    service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+    # Uma única conexão httplib2 (keep-alive) para todo o serviço, com timeout explícito.
+    # static_discovery=True: usa o documento de descoberta empacotado na lib (sem GET na subida)
+    authed_http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    service = build("gmail", "v1", http=authed_http, cache_discovery=False, static_discovery=True)
     return service
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+from functools import lru_cache
 from typing import Optional
 import gspread
 
@@ -14,9 +15,11 @@ def _get_service_account_email(credentials_path: str) -> Optional[str]:
         return None
 
 
+@lru_cache(maxsize=None)
 def get_client(credentials_path: str) -> gspread.Client:
     """
     Autentica com uma service account e retorna um cliente gspread.
+    Um cliente por credencial no processo: reaberturas reaproveitam a sessão HTTP autenticada.
     """
     return gspread.service_account(filename=credentials_path)
 
@@ -3,6 +3,21 @@ import base64
 from bs4 import BeautifulSoup
 from typing import Dict, Iterable, Optional, Any
 
+try:
+    # opcional: parser HTML em C, bem mais rápido que html.parser; lexbor no selectolax >= 1.0, modest nas versões antigas
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml  # opcional: backend em C do BeautifulSoup (quando não há selectolax)
+    _BS4_PARSER = "lxml"
+except ImportError:
+    _BS4_PARSER = "html.parser"
+
 def _pad_b64url(data: str) -> str:
     return data + "=" * (-len(data) % 4)
 
@@ -16,20 +31,31 @@ def get_header(headers: Iterable[Dict[str, str]], name: str) -> Optional[str]:
     return None
 
 def _walk_parts(payload: Dict[str, Any]):
-    if not payload:
-        return
-    yield payload
-    parts = payload.get("parts") or []
-    for p in parts:
-        yield from _walk_parts(p)
+    """Partes em pré-ordem (mesma ordem da recursão), com pilha explícita em vez de yield from por nível."""
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if not part:
+            continue
+        yield part
+        parts = part.get("parts")
+        if parts:
+            stack.extend(reversed(parts))
 
 def _extract_text_from_html(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style"]):
-        tag.decompose()
-    text = soup.get_text(separator="\n")
-    lines = [ln.strip() for ln in text.splitlines()]
-    return "\n".join([ln for ln in lines if ln])
+    if HTMLParser is not None:
+        tree = HTMLParser(html)
+        tree.strip_tags(["script", "style"])
+        text = tree.root.text(separator="\n") if tree.root is not None else ""
+    else:
+        soup = BeautifulSoup(html, _BS4_PARSER)
+        for tag in soup.find_all(["script", "style"]):
+            tag.decompose()
+        text = soup.get_text(separator="\n")
+    return "\n".join(s for s in (ln.strip() for ln in text.splitlines()) if s)
+
+def _decode_text(data: str) -> str:
+    return b64url_decode(data).decode("utf-8", errors="replace")
 
 def extract_prefer_plaintext(payload: Dict[str, Any]) -> str:
     """
@@ -37,9 +63,10 @@ def extract_prefer_plaintext(payload: Dict[str, Any]) -> str:
       1) Prioriza 'text/plain'
       2) Se não houver, converte 'text/html' para texto
       3) Caso contrário, string vazia
+    Só decodifica as partes de texto: o 1º text/plain encerra a busca, o HTML só se não houver plain
+    (anexos e imagens nunca passam pelo base64).
     """
-    text_plain = None
-    text_html = None
+    html_refs = []
 
     for part in _walk_parts(payload):
         mime_type = part.get("mimeType", "")
@@ -48,19 +75,15 @@ def extract_prefer_plaintext(payload: Dict[str, Any]) -> str:
         if not data:
             continue
 
-        decoded = b64url_decode(data)
-        try:
-            content = decoded.decode("utf-8", errors="replace")
-        except Exception:
-            content = decoded.decode(errors="replace")
-
-        if mime_type.startswith("text/plain") and not text_plain:
-            text_plain = content
-        elif mime_type.startswith("text/html") and not text_html:
-            text_html = content
+        if mime_type.startswith("text/plain"):
+            text_plain = _decode_text(data)
+            if text_plain:
+                return text_plain.strip()
+        elif mime_type.startswith("text/html"):
+            html_refs.append(data)
 
-    if text_plain:
-        return text_plain.strip()
-    if text_html:
-        return _extract_text_from_html(text_html)
+    for data in html_refs:
+        text_html = _decode_text(data)
+        if text_html:
+            return _extract_text_from_html(text_html)
     return ""
@@ -1,5 +1,5 @@
-import os
 import json
+from functools import lru_cache
 
 SYSTEM_INSTRUCTIONS = (
     "Você é um extrator de dados de cotações hoteleiras. "
@@ -53,16 +53,16 @@ EXAMPLE = [
     }
 ]
 
-def build_user_prompt(fields: list[str], meta: dict, body_clean: str) -> str:
+# O exemplo é fixo: serializado uma vez na importação, não a cada prompt
+_EXAMPLE_JSON = json.dumps(EXAMPLE, ensure_ascii=False)
+
+@lru_cache(maxsize=8)
+def _static_prefix(fields: tuple[str, ...]) -> str:
     """
-    Monta o prompt para a LLM com:
-      - lista de campos do cabeçalho (fields)
-      - metadados do e-mail (meta)
-      - corpo já limpo (body_clean)
-    Retorna uma string pronta para 'generate_content'.
+    Parte fixa do prompt (contexto, campos, formato, exemplo, regras) para um cabeçalho.
+    Vem antes dos dados do e-mail para o prefixo ser idêntico entre chamadas (cache de prompt do provedor).
     """
-    fields_lines = os.linesep.join(f"- {k}" for k in fields)
-
+    fields_lines = "\n".join(f"- {k}" for k in fields)
     return (
         "Contexto:\n"
         "O texto abaixo é um e-mail (em português) possivelmente com histórico. "
@@ -76,16 +76,7 @@ def build_user_prompt(fields: list[str], meta: dict, body_clean: str) -> str:
         "representando UMA linha/uma cotação para aquele tipo de quarto.\n"
         "NÃO inclua nenhum texto fora do JSON/ARRAY JSON.\n\n"
         "Exemplo (didático; valores meramente ilustrativos):\n"
-        f"{json.dumps(EXAMPLE, ensure_ascii=False)}\n\n"
-        "Metadados:\n"
-        f"- Timestamp: {meta.get('timestamp','')}\n"
-        f"- Assunto: {meta.get('subject','')}\n"
-        f"- Remetente (quem enviou): {meta.get('from','')}\n"
-        f"- Destinatário (quem recebeu): {meta.get('to','')}\n\n"
-        "Corpo:\n"
-        "---\n"
-        f"{body_clean}\n"
-        "---\n"
+        f"{_EXAMPLE_JSON}\n\n"
         "Regras de preenchimento (IMPORTANTES):\n"
         "- \"Fornecedor\": SEMPRE preencher com o REMETENTE (nome e/ou e-mail de quem enviou), não use o destinatário.\n"
         "- \"Check-in\" e \"Check-out\": quando houver período (ex.: '24/11/2025 a 26/11/2025'), converter cada data para ISO 'AAAA-MM-DD'. "
@@ -98,5 +89,26 @@ def build_user_prompt(fields: list[str], meta: dict, body_clean: str) -> str:
         "- \"Preço (num)\": retornar SOMENTE o número, em notação decimal com ponto e duas casas (ex.: '508.20'); sem 'R$', sem milhares, sem texto.\n"
         "- Demais campos: preencher a partir do e-mail; se não existir, use \"\".\n"
         "- NÃO invente valores; se tiver dúvida real, use \"\".\n"
-        "- NÃO inclua campos além dos listados.\n"
+        "- NÃO inclua campos além dos listados.\n\n"
+    )
+
+def build_user_prompt(fields: list[str], meta: dict, body_clean: str) -> str:
+    """
+    Monta o prompt para a LLM com:
+      - lista de campos do cabeçalho (fields)
+      - metadados do e-mail (meta)
+      - corpo já limpo (body_clean)
+    Retorna uma string pronta para 'generate_content'.
+    """
+    return (
+        _static_prefix(tuple(fields)) +
+        "Metadados:\n"
+        f"- Timestamp: {meta.get('timestamp','')}\n"
+        f"- Assunto: {meta.get('subject','')}\n"
+        f"- Remetente (quem enviou): {meta.get('from','')}\n"
+        f"- Destinatário (quem recebeu): {meta.get('to','')}\n\n"
+        "Corpo:\n"
+        "---\n"
+        f"{body_clean}\n"
+        "---\n"
     )
@@ -1,13 +1,20 @@
 import re
 from datetime import datetime
 
+_NUM_RE = re.compile(r'\d+(?:[\.,]\d+)?')
+_DATE_RANGE_RE = re.compile(r'\((\d{1,2})\s*a\s*(\d{1,2})/(\d{1,2})/(\d{4})\)')
+_WS_RE = re.compile(r'\s+')
+_ISS_RE = re.compile(r'(\d{1,2}(?:[\.,]\d{1,2})?)\s*%.*ISS', re.I)
+_ROOM_RE = re.compile(r'(executivo|luxo|standard|superior|frente mar|vista lateral|twin|duplo|triplo|sgl/dbl)', re.I)
+_SGL_DBL_PRICE_RE = re.compile(r'SGL/DBL\s*R\$\s*([\d\.\,]+)', re.I)
+
 def _to_float_brl(s: str) -> float:
     s = s.replace('.', '').replace(',', '.')
-    return float(re.search(r'\d+(?:[\.,]\d+)?', s).group())
+    return float(_NUM_RE.search(s).group())
 
 def parse_date_range_pt(body: str):
     # Ex.: "Confirmamos disponibilidade para (01 a 04/01/2026)"
-    m = re.search(r'\((\d{1,2})\s*a\s*(\d{1,2})/(\d{1,2})/(\d{4})\)', body)
+    m = _DATE_RANGE_RE.search(body)
     if not m: 
         return None, None
     d1, d2, mm, yyyy = map(int, m.groups())
@@ -22,22 +29,22 @@ def extract_tabular_quotes(body: str):
       SGL/DBL R$ 975,00 + 5% ISS
     retorna lista de dicts com Tipo de quarto e Preço (num)
     """
-    lines = [re.sub(r'\s+', ' ', ln.strip('*•· \t')) for ln in body.splitlines() if ln.strip()]
+    lines = [_WS_RE.sub(' ', ln.strip('*•· \t')) for ln in body.splitlines() if ln.strip()]
     rows, last_room = [], None
 
     # taxa ISS (se existir)
     iss = None
     for ln in lines:
-        m_iss = re.search(r'(\d{1,2}(?:[\.,]\d{1,2})?)\s*%.*ISS', ln, re.I)
+        m_iss = _ISS_RE.search(ln)
         if m_iss:
             iss = m_iss.group(1) + '% ISS'; break
 
     for ln in lines:
         # captura nome de categoria/quarto
-        if re.search(r'(executivo|luxo|standard|superior|frente mar|vista lateral|twin|duplo|triplo|sgl/dbl)', ln, re.I):
+        if _ROOM_RE.search(ln):
             last_room = ln
         # captura preço linha seguinte
-        m_price = re.search(r'SGL/DBL\s*R\$\s*([\d\.\,]+)', ln, re.I)
+        m_price = _SGL_DBL_PRICE_RE.search(ln)
         if m_price and last_room:
             price_num = _to_float_brl(m_price.group(1))
             rows.append({
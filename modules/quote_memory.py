@@ -0,0 +1,92 @@
+"""
+Memória das cotações já extraídas (sqlite), para o extrator não repetir ofertas que
+o hotel só re-citou em outro e-mail da conversa.
+
+- related(...): cotações anteriores do mesmo remetente/hotel, em texto para o prompt.
+- keep_new(...): descarta itens cuja chave (hotel, check-in, categoria, preço) já veio
+  de OUTRO e-mail e registra os novos. Reprocessar o mesmo e-mail não descarta nada.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+MEMORY_DB_PATH = os.getenv("QUOTE_MEMORY_DB", os.path.join(".cache", "quote_memory.sqlite"))
+
+_LOCK = threading.Lock()
+
+
+def memory_enabled() -> bool:
+    """Desligada por padrão; QUOTE_MEMORY=1 liga."""
+    return os.getenv("QUOTE_MEMORY", "0").strip() == "1"
+
+
+@lru_cache(maxsize=None)
+def _conn() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(MEMORY_DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(MEMORY_DB_PATH, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS quotes ("
+        " k TEXT PRIMARY KEY, source TEXT, sender TEXT, hotel TEXT,"
+        " checkin TEXT, categoria TEXT, preco TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS quotes_sender ON quotes (sender)")
+    conn.execute("CREATE INDEX IF NOT EXISTS quotes_hotel ON quotes (hotel)")
+    return conn
+
+
+def _norm(s: str) -> str:
+    return " ".join((s or "").lower().split())
+
+
+def source_id(ts: str, sender: str, subject: str) -> str:
+    """Identificador estável do e-mail de origem."""
+    return hashlib.sha256("\x00".join((ts, sender, subject)).encode("utf-8")).hexdigest()[:16]
+
+
+def _item_key(item: Dict[str, str]) -> Tuple[str, str, str, str]:
+    return (
+        _norm(item.get("Nome do hotel", "")),
+        _norm(item.get("Check-in", "")),
+        _norm(item.get("Categoria do quarto", "")),
+        _norm(item.get("Preço (num)", "")),
+    )
+
+
+def related(sender: str, hotel: str, limit: int = 5) -> str:
+    """Até `limit` cotações já extraídas do mesmo remetente ou hotel, uma por linha ("" se nenhuma)."""
+    sender_n, hotel_n = _norm(sender), _norm(hotel)
+    if not sender_n and not hotel_n:
+        return ""
+    with _LOCK:
+        rows = _conn().execute(
+            "SELECT hotel, checkin, categoria, preco FROM quotes"
+            " WHERE (sender = ? AND sender != '') OR (hotel = ? AND hotel != '')"
+            " ORDER BY rowid DESC LIMIT ?",
+            (sender_n, hotel_n, limit),
+        ).fetchall()
+    return "\n".join(f"- {h} | {c} | {cat} | {p}" for h, c, cat, p in rows)
+
+
+def keep_new(items: List[Dict[str, str]], source: str, sender: str) -> List[Dict[str, str]]:
+    """Itens que ainda não vieram de outro e-mail; os mantidos entram na memória."""
+    keys = {_item_key(it) for it in items}
+    hashed = {k: hashlib.sha256("\x00".join(k).encode("utf-8")).hexdigest() for k in keys}
+    with _LOCK:
+        conn = _conn()
+        seen = {
+            k for k, h in hashed.items()
+            if conn.execute("SELECT 1 FROM quotes WHERE k = ? AND source != ?", (h, source)).fetchone()
+        }
+        kept = [it for it in items if _item_key(it) not in seen]
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO quotes (k, source, sender, hotel, checkin, categoria, preco)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((hashed[k], source, _norm(sender), *k) for k in {_item_key(it) for it in kept}),
+            )
+    return kept
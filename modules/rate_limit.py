@@ -0,0 +1,56 @@
+from __future__ import annotations
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """
+    Token bucket proativo (taxa por minuto), seguro entre threads.
+    Cada `acquire(n)` reserva n fichas; se o balde estiver vazio, espera o tempo
+    necessário para reabastecer — evita disparar 429 em vez de só reagir a eles.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute deve ser > 0")
+        self.rate_per_s = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Reserva `amount` fichas e retorna quantos segundos esperar antes de usá-las."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate_per_s)
+            self._last = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_s
+
+    def acquire(self, amount: float = 1.0) -> None:
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1.0) -> None:
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+def bucket_from_env(var_name: str) -> Optional[TokenBucket]:
+    """Cria um TokenBucket a partir de uma variável de ambiente (ex.: OPENROUTER_RPM=500). Vazio/0 = sem limite."""
+    raw = os.getenv(var_name, "").strip()
+    try:
+        rate = float(raw) if raw else 0.0
+    except ValueError:
+        rate = 0.0
+    return TokenBucket(rate) if rate > 0 else None
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token), suficiente para o limite de TPM."""
+    return len(text or "") // 4 + 1
@@ -1,18 +1,89 @@
 import re
+from typing import List
+
+# Regexes compiladas uma vez (chamadas por e-mail)
+_FWD_BANNER_RE = re.compile(r"[- ]{5,} Forwarded message [- ]{5,}", re.I)
+_FWD_HEADER_PREFIXES = ("From:", "De:", "To:", "Para:", "Subject:", "Assunto:", "Date:", "Data:")
+_URL_RE = re.compile(r"https?://\S+")
+_QUOTE_ANCHOR_RE = re.compile(r"(valores sobre nossas diárias|acomodações disponíveis|diária inclui|nossos valores)", re.I)
+_QUOTE_ANCHORS = ("valores sobre nossas diárias", "acomodações disponíveis", "diária inclui", "nossos valores")
+# equivale a [ \t]+ -> " ", sem reescrever cada espaço simples
+_HSPACE_RE = re.compile(r" [ \t]+|\t[ \t]*")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+def _drop_forwarded_blocks(lines: List[str]) -> List[str]:
+    """Banner "---- Forwarded message ----" e o bloco seguinte (até a próxima linha em branco) viram uma linha vazia."""
+    out: List[str] = []
+    i, n = 0, len(lines)
+    while i < n:
+        ln = lines[i]
+        if i < n - 1 and ln[:1] in ("-", " ") and _FWD_BANNER_RE.fullmatch(ln):
+            k = i + 2
+            while k < n - 1 and lines[k]:
+                k += 1
+            out.append("")
+            if k >= n - 1:
+                break
+            i = k
+            continue
+        out.append(ln)
+        i += 1
+    return out
+
+def _drop_signatures(lines: List[str]) -> List[str]:
+    """Linha "--" (assinatura) + linhas em branco/indentadas logo abaixo viram uma linha vazia."""
+    out: List[str] = []
+    i, n = 0, len(lines)
+    while i < n:
+        ln = lines[i]
+        if ln[:2] == "--" and not ln[2:].strip():
+            i += 1
+            while i < n and (not lines[i] or lines[i][0].isspace()):
+                i += 1
+            out.append("")
+            continue
+        out.append(ln)
+        i += 1
+    return out
+
+def _find_quote_anchor(t: str) -> int:
+    """Posição da 1ª âncora de cotação (-1 se não houver); str.find no texto em minúsculas."""
+    low = t.lower()
+    if len(low) != len(t):
+        # lower() mudou o tamanho (caracteres raros): índices não batem, vai de regex
+        m = _QUOTE_ANCHOR_RE.search(t)
+        return m.start() if m else -1
+    hits = [i for i in (low.find(a) for a in _QUOTE_ANCHORS) if i != -1]
+    return min(hits) if hits else -1
 
 def strip_forwarding_noise(s: str) -> str:
     """Limpa ruídos comuns de encaminhamento sem remover o miolo (preços/políticas)."""
     if not isinstance(s, str):
         return ""
-    t = s.replace("\r\n", "\n").replace("\r", "\n")
-    # blocos de encaminhamento
-    t = re.sub(r"(?m)^[- ]{5,}\s*Forwarded message\s*[- ]{5,}\n.*?(?=\n\n|\Z)", "", t, flags=re.I|re.S)
-    # cabeçalhos repetidos
-    t = re.sub(r"(?m)^(From|De|To|Para|Subject|Assunto|Date|Data):.*$", "", t)
-    # links/assinaturas
-    t = re.sub(r"https?://\S+", "", t)
-    t = re.sub(r"(?mi)^--\s*$.*?(?=\n\S|\Z)", "", t, flags=re.S)
-    # normalização
-    t = re.sub(r"[ \t]+", " ", t)
-    t = re.sub(r"\n{3,}", "\n\n", t)
+    # varredura por linha com operações de string no lugar de várias regex sobre o corpo todo
+    # sem "\r" (caso comum) não há o que normalizar: evita duas cópias do corpo
+    if "\r" in s:
+        s = s.replace("\r\n", "\n").replace("\r", "\n")
+    lines = s.split("\n")
+    # blocos de encaminhamento (só varre as linhas se o banner puder existir)
+    if "forwarded message" in s.lower():
+        lines = _drop_forwarded_blocks(lines)
+    for i, ln in enumerate(lines):
+        # cabeçalhos repetidos
+        if ln.startswith(_FWD_HEADER_PREFIXES):
+            lines[i] = ""
+        # urls
+        elif "http" in ln:
+            lines[i] = _URL_RE.sub("", ln)
+    # assinaturas (só varre as linhas se alguma puder começar com "--")
+    if s.startswith("--") or "\n--" in s:
+        lines = _drop_signatures(lines)
+    t = "\n".join(lines)
+    # heurística: se encontrar âncoras típicas de cotação, corta a partir dali
+    start = _find_quote_anchor(t)
+    if start > 0:
+        t = t[start:]
+    t = _HSPACE_RE.sub(" ", t)
+    if "\n\n\n" in t:
+        t = _BLANK_LINES_RE.sub("\n\n", t)
     return t.strip()
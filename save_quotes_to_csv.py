@@ -1,8 +1,14 @@
 import os
 import json
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List
 
 from dotenv import load_dotenv
+
+try:
+    import orjson  # opcional: parser em C, bem mais rápido que json da stdlib
+except ImportError:
+    orjson = None
+
 from utils.headers import HEADER_FIELDS
 from utils.login_sheets import open_spreadsheet_by_id, open_worksheet, get_first_row
 
@@ -10,41 +16,71 @@ IN_JSONL = "outputs/quotes_extracted.jsonl"
 CREDENTIALS_PATH = "credentials/sheets-parrots.json"
 WORKSHEET_NAME = "quotes"
 
+_HF = tuple(HEADER_FIELDS)
+
 
 def _dict_to_row(d: Dict[str, str]) -> List[str]:
     """Converte o dict para a lista na ordem exata do cabeçalho."""
-    return [d.get(k, "") for k in HEADER_FIELDS]
+    return [d.get(k, "") for k in _HF]
 
 
 def _load_jsonl(path: str) -> List[Dict[str, str]]:
     if not os.path.exists(path):
         raise SystemExit(f"⛔ Arquivo não encontrado: {path}. Rode antes: llm_extract_quotes.py")
 
+    # Leitura única em bytes; orjson (se instalado) parseia direto dos bytes
+    with open(path, "rb") as f:
+        blob = f.read()
+    loads = orjson.loads if orjson is not None else json.loads
+
     rows = []
-    with open(path, "r", encoding="utf-8") as f:
-        for ln, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception as e:
-                print(f"⚠️ Linha {ln} inválida no JSONL: {e}")
-                continue
-            # garante todas as colunas
-            rows.append({k: obj.get(k, "") for k in HEADER_FIELDS})
+    for ln, line in enumerate(blob.split(b"\n"), 1):
+        if not line.strip():
+            continue
+        try:
+            obj = loads(line)
+        except Exception as e:
+            print(f"⚠️ Linha {ln} inválida no JSONL: {e}")
+            continue
+        if not isinstance(obj, dict):
+            print(f"⚠️ Linha {ln} ignorada: não é um objeto JSON.")
+            continue
+        # o próprio dict parseado; a projeção nas colunas fica em _dict_to_row
+        rows.append(obj)
     return rows
 
 
-def _append_in_chunks(ws, rows_to_append: List[List[str]], chunk_size: int = 200):
-    """Evita lotar a API enviando em lotes."""
-    total = len(rows_to_append)
-    if total == 0:
-        return
-    for i in range(0, total, chunk_size):
-        chunk = rows_to_append[i:i + chunk_size]
-        ws.append_rows(chunk, value_input_option="USER_ENTERED")
-        print(f"➡️  Enviado(s) {min(i + len(chunk), total)}/{total} linha(s)...")
+# Limite de payload por requisição à API do Sheets (~10 MB), com folga
+MAX_REQUEST_BYTES = 9 * 1024 * 1024
+
+
+def _split_by_payload(rows: Iterable[List[str]], max_bytes: int) -> Iterator[List[List[str]]]:
+    """Agrupa as linhas (sob demanda) em lotes cujo tamanho estimado (bytes das células) cabe em max_bytes."""
+    current, size = [], 0
+    for row in rows:
+        # +4 por célula: aspas/vírgula/colchetes do JSON
+        row_size = sum(len(c.encode("utf-8")) + 4 for c in map(str, row))
+        if current and size + row_size > max_bytes:
+            yield current
+            current, size = [], 0
+        current.append(row)
+        size += row_size
+    if current:
+        yield current
+
+
+def _append_in_chunks(ws, rows_to_append: Iterable[List[str]], total: int, max_bytes: int = MAX_REQUEST_BYTES) -> int:
+    """
+    Envia tudo em uma única requisição append; só divide quando o payload
+    estimado passaria do limite de tamanho da API. Aceita um gerador de linhas
+    (só o lote atual fica em memória) e retorna quantas foram enviadas.
+    """
+    sent = 0
+    for batch in _split_by_payload(rows_to_append, max_bytes):
+        ws.append_rows(batch, value_input_option="USER_ENTERED")
+        sent += len(batch)
+        print(f"➡️  Enviado(s) {sent}/{total} linha(s)...")
+    return sent
 
 
 def main():
@@ -72,10 +108,9 @@ def main():
         print("   Vou continuar e fazer append mesmo assim.")
 
     # 4) Converter para linhas e enviar em batch
-    rows_to_append = [_dict_to_row(d) for d in dict_rows]
-    _append_in_chunks(ws, rows_to_append, chunk_size=200)
+    sent = _append_in_chunks(ws, (_dict_to_row(d) for d in dict_rows), total=len(dict_rows))
 
-    print(f"✅ Inseridas {len(rows_to_append)} linha(s) na aba '{WORKSHEET_NAME}'.")
+    print(f"✅ Inseridas {sent} linha(s) na aba '{WORKSHEET_NAME}'.")
 
 
 if __name__ == "__main__":